@@ -0,0 +1,48 @@
+"""
+Per-entry cost of sanitizing post contents, compared with the previous chain of `re.sub` calls.
+
+Run from the repository root: `python3 -m benchmarks.content_sanitizer`
+"""
+
+import re
+import timeit
+
+from benchmarks.fixtures import generate_post
+from pbrr.content_sanitizer import ContentSanitizer
+
+SITE_URL = "https://example.test"
+# (description, paragraphs) roughly a short note, a regular post and a long full-content article
+POST_SIZES = [("small", 2), ("medium", 20), ("large", 200)]
+NUMBER = 20
+
+
+def chained_substitutions(content: str) -> str:
+    content = re.sub(r"<script>.*?<\/script>", "", content, count=0, flags=re.I | re.S)
+    content = re.sub(r"<img (.*?) />", r'<img loading="lazy" \1 />', content, count=0, flags=re.I | re.S)
+    content = re.sub(r' class="button"', "", content, count=0, flags=re.I | re.S)
+    content = re.sub(r"<a (.*?)>", r'<a target="_blank" \1>', content, count=0, flags=re.I | re.S)
+    return re.sub(r" href=\"(/.*?)\"", r' href="{site}\1"'.format(site=SITE_URL), content, count=0, flags=re.I | re.S)
+
+
+def main() -> None:
+    print(
+        "{size:>8} {length:>10} {chained:>14} {sanitizer:>14}".format(
+            size="post", length="chars", chained="chained (ms)", sanitizer="sanitizer (ms)"
+        )
+    )
+    for description, paragraphs in POST_SIZES:
+        content = generate_post(paragraphs)
+        chained = min(timeit.repeat(lambda: chained_substitutions(content), number=NUMBER, repeat=5)) / NUMBER
+        sanitizer = (
+            min(timeit.repeat(lambda: ContentSanitizer(site_url=SITE_URL).sanitize(content), number=NUMBER, repeat=5))
+            / NUMBER
+        )
+        print(
+            "{size:>8} {length:>10} {chained:>14.3f} {sanitizer:>14.3f}".format(
+                size=description, length=len(content), chained=chained * 1000, sanitizer=sanitizer * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Whole runs (`run.py`, so `PBRR.run` plus startup) against a local server with hundreds of synthetic feeds: a first run
+with an empty data folder, then a second one where feeds reply not modified. Reports wall time, CPU time, peak memory,
+requests, bytes and the per-stage totals of `run-stats.json`. Wall time, CPU time and peak memory are compared with the
+stored baseline.
+
+Run from the repository root: `python3 -m benchmarks.end_to_end [--feeds 300] [--save-baseline]`
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.feed_server import FeedServer
+from pbrr.run_stats import (
+    KEY_BODY_BYTES,
+    KEY_DOWNLOAD_TIME,
+    KEY_PARSE_TIME,
+    KEY_REQUEST_TIME,
+    KEY_SANITIZE_TIME,
+    KEY_SERIALIZE_TIME,
+    KEY_WIRE_BYTES,
+    KEY_WRITE_TIME,
+    RUN_STATS_FILENAME,
+)
+from pbrr.settings import Settings
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILEPATH = os.path.join(REPOSITORY_PATH, "benchmarks", "baselines", "end_to_end.json")
+OPML_FILENAME = "subscriptions.xml"
+SCENARIOS = ["cold", "warm"]
+
+# lower is better, and checked against the baseline
+CHECKED_METRICS = ["wall_time", "cpu_time", "peak_rss_mb"]
+# informative only. Stage times are wall times summed over threads competing for the GIL, so mostly noise
+STAGE_METRICS = [
+    KEY_REQUEST_TIME,
+    KEY_DOWNLOAD_TIME,
+    KEY_PARSE_TIME,
+    KEY_SANITIZE_TIME,
+    KEY_SERIALIZE_TIME,
+    KEY_WRITE_TIME,
+]
+# informative, they only change along with the behaviour
+COUNTED_METRICS = ["requests", "sent_bytes", KEY_WIRE_BYTES, KEY_BODY_BYTES]
+# differences below these are noise, whatever the percentage
+MIN_TIME_DIFFERENCE = 0.1
+MIN_MEMORY_DIFFERENCE_MB = 5
+
+
+def run_scenario(feed_server: FeedServer, data_path: str) -> Dict[str, Any]:
+    counters_before = feed_server.counters()
+    log_filepath = os.path.join(data_path, "benchmark.log")
+
+    with open(log_filepath, "w", encoding="utf8") as log_file:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPOSITORY_PATH, "run.py"), data_path, OPML_FILENAME],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            cwd=REPOSITORY_PATH,
+        )
+        # `wait4` gives the resource usage of this process alone
+        _, status, resource_usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    if process.returncode != 0:
+        with open(log_filepath, "r", encoding="utf8") as log_file:
+            print(log_file.read()[-2000:])
+        raise SystemExit("Run failed with exit code {}".format(process.returncode))
+
+    with open(os.path.join(data_path, RUN_STATS_FILENAME), "r", encoding="utf8") as file_handle:
+        run_stats = json.load(file_handle)
+
+    counters = feed_server.counters()
+    metrics: Dict[str, Any] = {
+        "wall_time": wall_time,
+        # user + system, less noisy than the wall time
+        "cpu_time": resource_usage.ru_utime + resource_usage.ru_stime,
+        # kilobytes on Linux
+        "peak_rss_mb": resource_usage.ru_maxrss / 1024,
+        "requests": counters["requests"] - counters_before["requests"],
+        "sent_bytes": counters["sent_bytes"] - counters_before["sent_bytes"],
+        "outcomes": run_stats["totals"]["outcomes"],
+        "statuses": {
+            status: count - counters_before["statuses"].get(status, 0)
+            for status, count in counters["statuses"].items()
+            if count > counters_before["statuses"].get(status, 0)
+        },
+    }
+    for key in STAGE_METRICS + [KEY_WIRE_BYTES, KEY_BODY_BYTES]:
+        metrics[key] = run_stats["totals"][key]
+    return metrics
+
+
+def compare(scenario: str, metrics: Dict[str, Any], baseline: Optional[Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    print(
+        "\n{scenario}: {outcomes}, HTTP statuses {statuses}".format(
+            scenario=scenario, outcomes=metrics["outcomes"], statuses=metrics["statuses"]
+        )
+    )
+    print(
+        "{metric:>16} {current:>14} {baseline:>14} {change:>8}".format(
+            metric="metric", current="current", baseline="baseline", change="change"
+        )
+    )
+
+    for metric in CHECKED_METRICS + STAGE_METRICS + COUNTED_METRICS:
+        current = metrics[metric]
+        previous = baseline.get(metric) if baseline else None
+        change = ""
+        if previous:
+            change = "{:+.1f}%".format((current - previous) / previous * 100)
+            min_difference = MIN_MEMORY_DIFFERENCE_MB if metric == "peak_rss_mb" else MIN_TIME_DIFFERENCE
+            if (
+                metric in CHECKED_METRICS
+                and current > previous * (1 + tolerance)
+                and current - previous > min_difference
+            ):
+                change += " !"
+                regressions.append("{scenario} {metric}".format(scenario=scenario, metric=metric))
+
+        print(
+            "{metric:>16} {current:>14} {baseline:>14} {change:>8}".format(
+                metric=metric, current=_format(current), baseline=_format(previous), change=change
+            )
+        )
+
+    return regressions
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "{:.3f}".format(value)
+    return str(value)
+
+
+def main() -> None:
+    argument_parser = argparse.ArgumentParser(description="End to end runs against a local feed server")
+    argument_parser.add_argument("--feeds", type=int, default=300, help="number of synthetic feeds")
+    argument_parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="relative increase over the baseline reported as a regression"
+    )
+    argument_parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    arguments = argument_parser.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(BASELINE_FILEPATH):
+        with open(BASELINE_FILEPATH, "r", encoding="utf8") as file_handle:
+            baseline = json.load(file_handle)
+    if baseline and baseline.get("feeds") != arguments.feeds:
+        print("Baseline is for {} feeds, not comparing".format(baseline.get("feeds")))
+        baseline = {}
+
+    feed_server = FeedServer(num_feeds=arguments.feeds)
+    feed_server.start()
+
+    results: Dict[str, Any] = {}
+    regressions: List[str] = []
+    try:
+        with tempfile.TemporaryDirectory() as data_path:
+            with open(os.path.join(data_path, OPML_FILENAME), "w", encoding="utf8") as file_handle:
+                file_handle.write(feed_server.opml())
+            # all synthetic feeds share the server's host, which the per-host cap would otherwise limit to a couple of
+            # requests at a time, hiding the concurrency of a real OPML with many hosts
+            settings = Settings(base_output_path=data_path)
+            settings.max_connections_per_host = settings.fetch_workers
+            settings.save()
+
+            # same data folder, so the second run finds the state (HTTP cache, entries...) of the first one
+            for scenario in SCENARIOS:
+                results[scenario] = run_scenario(feed_server, data_path)
+                regressions += compare(
+                    scenario, results[scenario], baseline.get("scenarios", {}).get(scenario), arguments.tolerance
+                )
+    finally:
+        feed_server.stop()
+
+    if arguments.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILEPATH), exist_ok=True)
+        with open(BASELINE_FILEPATH, "w", encoding="utf8") as file_handle:
+            json.dump({"feeds": arguments.feeds, "scenarios": results}, file_handle, indent=2)
+        print("\nBaseline saved to {}".format(BASELINE_FILEPATH))
+    elif regressions:
+        raise SystemExit("\nRegressions (over {:.0%}): {}".format(arguments.tolerance, ", ".join(regressions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Memory footprint of the parsed entries of a big run, and cost of reading their ids, compared with the previous
+dict-backed classes that computed the hashes on each access.
+
+Run from the repository root: `python3 -m benchmarks.entries_memory`
+"""
+
+import hashlib
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional
+
+from pbrr.parsed_feed_item import ParsedFeedItem
+from pbrr.parsed_feed_site import ParsedFeedSite
+
+NUM_SITES = 5000
+ENTRIES_PER_SITE = 10
+# shared by all entries, so only the objects themselves are measured and not their contents
+CONTENT = "<p>Lorem ipsum dolor sit amet</p>" * 100
+
+
+class DictParsedFeedSite:
+    def __init__(self, title: str, category: Optional[str], link: str) -> None:
+        self.title = title
+        self.link = link
+        self.category = category
+
+    @property
+    def id(self) -> str:
+        hashAlgoritm = hashlib.md5()
+        hashAlgoritm.update(str.encode(self.title))
+        return hashAlgoritm.hexdigest()
+
+
+class DictParsedFeedItem:
+    def __init__(self, title: str, link: str, published: datetime, content: str, parent: Any) -> None:
+        self.title = title
+        self.link = link
+        self.published = published
+        self.content = content
+        self.parent = parent
+
+    @property
+    def id(self) -> str:
+        hashAlgoritm = hashlib.md5()
+        hashAlgoritm.update(str.encode(self.link + self.title))
+        return hashAlgoritm.hexdigest()
+
+
+def generate_run(site_class: Callable[..., Any], item_class: Callable[..., Any]) -> List[Any]:
+    started = datetime(2024, 1, 1)
+    entries = []
+    for site_index in range(NUM_SITES):
+        site = site_class(
+            title=f"Site {site_index}", category=f"Category {site_index % 20}", link=f"https://s{site_index}.test"
+        )
+        for entry_index in range(ENTRIES_PER_SITE):
+            entries.append(
+                item_class(
+                    title=f"Post {entry_index} of site {site_index}",
+                    link=f"https://s{site_index}.test/posts/{entry_index}",
+                    published=started + timedelta(minutes=site_index * ENTRIES_PER_SITE + entry_index),
+                    content=CONTENT,
+                    parent=site,
+                )
+            )
+    return entries
+
+
+def read_ids(entries: List[Any]) -> None:
+    # what the writer & entry store do with each entry: read its id once and its site's id a few times
+    for entry in entries:
+        entry.id, entry.parent.id, entry.parent.id
+
+
+def measure(description: str, site_class: Callable[..., Any], item_class: Callable[..., Any]) -> None:
+    tracemalloc.start()
+    entries = generate_run(site_class, item_class)
+    allocated, _ = tracemalloc.get_traced_memory()
+    read_ids(entries)
+    allocated_with_ids, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ids_time = min(timeit.repeat(lambda: read_ids(entries), number=1, repeat=3))
+
+    print(
+        "{description:>8} {entries:>8} {allocated:>14.1f} {allocated_with_ids:>20.1f} {ids_time:>10.1f}".format(
+            description=description,
+            entries=len(entries),
+            allocated=allocated / 1024 / 1024,
+            allocated_with_ids=allocated_with_ids / 1024 / 1024,
+            ids_time=ids_time * 1000,
+        )
+    )
+
+
+def main() -> None:
+    print(
+        "{description:>8} {entries:>8} {allocated:>14} {allocated_with_ids:>20} {ids_time:>10}".format(
+            description="classes",
+            entries="entries",
+            allocated="allocated (MB)",
+            allocated_with_ids="after ids read (MB)",
+            ids_time="ids (ms)",
+        )
+    )
+    measure("dict", DictParsedFeedSite, DictParsedFeedItem)
+    measure("slots", ParsedFeedSite, ParsedFeedItem)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares parsing every entry of a big feed and then filtering, against the two-phase parsing `FeedParser` does
+(filter using cheap fields, then parse the content only of the kept entries).
+
+Run from the repository root: `python3 -m benchmarks.entries_parsing`
+"""
+
+import timeit
+
+import feedparser
+
+from benchmarks.fixtures import generate_rss
+from pbrr.feed_parser import EntryCandidate, FeedParser
+from pbrr.settings import Settings
+
+NUM_ENTRIES = 500
+PARAGRAPHS_PER_ENTRY = 20
+REPETITIONS = 5
+
+
+def parse_all_then_filter(parser: FeedParser, source_site: feedparser.FeedParserDict) -> None:
+    parsed_site = parser._parse_site(feed=source_site.feed, provided_title=None, category=None)
+    entries_count = len(source_site.entries)
+    parsed_entries = []
+    for index, entry in enumerate(source_site.entries):
+        published = parser._published_field_from(
+            entry=entry, entry_index=index, entry_reverse_index=(entries_count - index - 1)
+        )
+        parsed_entries.append(
+            EntryCandidate(
+                title=entry.title,
+                published=published,
+                entry=parser._parse_entry(entry=entry, parsed_site=parsed_site, published=published),
+            )
+        )
+    parser._filter_entries(parser._skip_entries(parsed_entries))
+
+
+def main() -> None:
+    settings = Settings(base_output_path=".")
+    parser = FeedParser(settings=settings)
+    source_site = feedparser.parse(
+        generate_rss("https://example.test", "Big feed", NUM_ENTRIES, PARAGRAPHS_PER_ENTRY, relative_links=True)
+    )
+
+    eager = min(timeit.repeat(lambda: parse_all_then_filter(parser, source_site), number=1, repeat=REPETITIONS))
+    two_phase = min(
+        timeit.repeat(
+            lambda: parser._parse_feed(source_site=source_site, title=None, category=None),
+            number=1,
+            repeat=REPETITIONS,
+        )
+    )
+
+    print(
+        "{entries} entries, keeping {kept}".format(entries=NUM_ENTRIES, kept=settings.num_entries_per_feed),
+    )
+    print("parse all, then filter: {time:8.2f} ms".format(time=eager * 1000))
+    print("two-phase:              {time:8.2f} ms".format(time=two_phase * 1000))
+    print("speedup:                {ratio:8.2f}x".format(ratio=eager / two_phase))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, NamedTuple, Optional
+from xml.sax.saxutils import quoteattr
+
+from benchmarks.fixtures import generate_atom, generate_rss
+
+GONE_PATH_PREFIX = "/gone"
+MOVED_PATH_PREFIX = "/moved"
+
+
+class SyntheticFeed(NamedTuple):
+    path: str
+    title: str
+    category: str
+    body: bytes
+    # seconds before answering
+    latency: float
+    # conditional request headers the feed supports, if any
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class FeedServer:
+    # local stand-in for the sites of an OPML file, with the behaviours found in the wild: varying sizes and
+    # latencies, conditional requests (or not), redirects, gone feeds, relative links and entries without dates
+    def __init__(self, num_feeds: int) -> None:
+        self.http_server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.base_url = "http://127.0.0.1:{port}".format(port=self.http_server.server_address[1])
+        # generated once, so later runs get the same bodies (and conditional requests can match)
+        self.feeds: Dict[str, SyntheticFeed] = {}
+        self.opml_paths: List[str] = []
+        for index in range(num_feeds):
+            self._add_feed(index)
+
+        self.requests = 0
+        self.sent_bytes = 0
+        self.statuses: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def counters(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "sent_bytes": self.sent_bytes, "statuses": dict(self.statuses)}
+
+    def opml(self) -> str:
+        categories: Dict[str, List[str]] = {}
+        for path in self.opml_paths:
+            # redirected feeds are served from their new path
+            feed = self.feeds.get(path) or self.feeds.get(MOVED_PATH_PREFIX + path)
+            title = feed.title if feed else path
+            category = feed.category if feed else "Gone"
+            categories.setdefault(category, []).append(
+                '<outline type="rss" text={title} title={title} xmlUrl={url}/>'.format(
+                    title=quoteattr(title), url=quoteattr(self.base_url + path)
+                )
+            )
+
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><opml version="1.0"><head><title>Benchmark</title></head>'
+            "<body>{}</body></opml>"
+        ).format(
+            "".join(
+                "<outline title={category} text={category}>{outlines}</outline>".format(
+                    category=quoteattr(category), outlines="".join(outlines)
+                )
+                for category, outlines in sorted(categories.items())
+            )
+        )
+
+    def _add_feed(self, index: int) -> None:
+        # seeded by index, so the same number of feeds always means the same feeds
+        generator = random.Random(index)
+        path = "/feed{index}.xml".format(index=index)
+
+        if index % 40 == 13:
+            self.opml_paths.append(GONE_PATH_PREFIX + path)
+            return
+
+        # listed at the OPML with its old url, then permanently redirected
+        if index % 30 == 7:
+            self.opml_paths.append(path)
+            path = MOVED_PATH_PREFIX + path
+        else:
+            self.opml_paths.append(path)
+
+        site_url = "{base_url}/site{index}".format(base_url=self.base_url, index=index)
+        title = "Site {index}".format(index=index)
+        num_entries = generator.choice([5, 10, 20, 40, 80])
+        paragraphs = generator.choice([1, 2, 4, 8])
+        if index % 2:
+            body = generate_atom(site_url, title, num_entries, paragraphs)
+        else:
+            body = generate_rss(
+                site_url,
+                title,
+                num_entries,
+                paragraphs,
+                relative_links=index % 3 == 0,
+                undated_every=5 if index % 4 == 0 else 0,
+            )
+
+        etag: Optional[str] = '"feed-{index}"'.format(index=index)
+        last_modified: Optional[str] = None
+        if index % 11 == 0:
+            # always replies with the whole feed
+            etag = None
+        elif index % 7 == 0:
+            etag = None
+            last_modified = formatdate(time.time() - 3600, usegmt=True)
+
+        self.feeds[path] = SyntheticFeed(
+            path=path,
+            title=title,
+            category="Category {}".format(index % 8),
+            body=body.encode("utf8"),
+            latency=1.0 if index % 50 == 49 else generator.uniform(0.005, 0.05),
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+    def _handler_class(self) -> Any:
+        feed_server = self
+
+        class FeedRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                if self.path.startswith(GONE_PATH_PREFIX):
+                    self._reply(410)
+                    return
+                if MOVED_PATH_PREFIX + self.path in feed_server.feeds:
+                    self._reply(301, headers={"Location": feed_server.base_url + MOVED_PATH_PREFIX + self.path})
+                    return
+
+                feed = feed_server.feeds.get(self.path)
+                if feed is None:
+                    self._reply(404)
+                    return
+
+                time.sleep(feed.latency)
+                if (feed.etag and self.headers.get("If-None-Match") == feed.etag) or (
+                    feed.last_modified and self.headers.get("If-Modified-Since") == feed.last_modified
+                ):
+                    self._reply(304)
+                    return
+
+                headers = {"Content-Type": "application/rss+xml; charset=utf-8"}
+                if feed.etag:
+                    headers["ETag"] = feed.etag
+                if feed.last_modified:
+                    headers["Last-Modified"] = feed.last_modified
+                self._reply(200, headers=headers, body=feed.body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _reply(self, status: int, headers: Optional[Dict[str, str]] = None, body: bytes = b"") -> None:
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+                with feed_server._lock:
+                    feed_server.requests += 1
+                    feed_server.sent_bytes += len(body)
+                    feed_server.statuses[status] = feed_server.statuses.get(status, 0) + 1
+
+        return FeedRequestHandler
@@ -0,0 +1,72 @@
+import time
+from email.utils import formatdate
+
+POST_PARAGRAPH = (
+    "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et "
+    'dolore magna aliqua. Ut enim ad minim veniam, <a href="/relative/post">quis nostrud exercitation</a> ullamco '
+    "laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse "
+    "cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui "
+    '<a href="https://example.test/elsewhere">officia deserunt</a> mollit anim id est laborum. Sed ut perspiciatis '
+    "unde omnis iste natus error sit voluptatem accusantium doloremque laudantium, totam rem aperiam.</p>"
+    '<p><img src="/images/picture.png" alt="picture" /></p>'
+    "<pre><code>for item in items:\n    print(item)</code></pre>"
+)
+POST_FOOTER = (
+    '<p><a class="button" href="https://example.test/subscribe">Subscribe</a></p>'
+    '<script type="text/javascript">console.log("tracking");</script>'
+)
+
+
+def generate_post(paragraphs: int) -> str:
+    return POST_PARAGRAPH * paragraphs + POST_FOOTER
+
+
+def generate_rss(
+    site_url: str,
+    title: str,
+    num_entries: int,
+    paragraphs: int,
+    relative_links: bool = False,
+    undated_every: int = 0,
+) -> str:
+    items = []
+    now = time.time()
+    for index in range(num_entries):
+        link = (
+            "/posts/{index}".format(index=index)
+            if relative_links
+            else "{site}/posts/{index}".format(site=site_url, index=index)
+        )
+        published = ""
+        if not undated_every or index % undated_every:
+            published = "<pubDate>{date}</pubDate>".format(date=formatdate(now - index * 3600 * 7, usegmt=True))
+        items.append(
+            "<item><title>{title} post {index}</title><link>{link}</link>{published}"
+            "<description><![CDATA[{content}]]></description></item>".format(
+                title=title, index=index, link=link, published=published, content=generate_post(paragraphs)
+            )
+        )
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+        "<title>{title}</title><link>{site}</link>{items}</channel></rss>"
+    ).format(title=title, site=site_url, items="".join(items))
+
+
+def generate_atom(site_url: str, title: str, num_entries: int, paragraphs: int) -> str:
+    entries = []
+    now = time.time()
+    for index in range(num_entries):
+        updated = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - index * 3600 * 5))
+        entries.append(
+            '<entry><title>{title} entry {index}</title><link href="{site}/entries/{index}"/>'
+            "<id>{site}/entries/{index}</id><updated>{updated}</updated>"
+            '<content type="html"><![CDATA[{content}]]></content></entry>'.format(
+                title=title, index=index, site=site_url, updated=updated, content=generate_post(paragraphs)
+            )
+        )
+
+    return (
+        '<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+        '<title>{title}</title><link href="{site}"/><updated>{updated}</updated>{entries}</feed>'
+    ).format(title=title, site=site_url, updated=time.strftime("%Y-%m-%dT%H:%M:%SZ"), entries="".join(entries))
@@ -0,0 +1,107 @@
+"""
+Serialization time and size of the site data files for each output format, with and without the precompressed
+`.gz`/`.br` copies.
+
+Run from the repository root: `python3 -m benchmarks.output_format`
+"""
+
+import gzip
+import time
+from typing import Any, Dict, List
+
+import brotli
+
+from benchmarks.fixtures import generate_post
+from pbrr.entry_store import EntryStore
+from pbrr.run_stats import RunStats
+from pbrr.settings import OUTPUT_FORMAT_INDENTED, OUTPUT_FORMAT_MINIFIED, Settings
+from pbrr.writer import (
+    BROTLI_QUALITY,
+    KEY_CATEGORY,
+    KEY_CATEGORY_ICON,
+    KEY_CONTENT,
+    KEY_DATETIME,
+    KEY_ENTRIES,
+    KEY_TITLE,
+    KEY_URL,
+    Writer,
+)
+
+# roughly a real output: 600 sites with their 10 most recent entries
+NUM_SITES = 600
+ENTRIES_PER_SITE = 10
+PARAGRAPHS_PER_ENTRY = 8
+
+
+def generate_sites_data() -> List[Dict[str, Any]]:
+    content = generate_post(PARAGRAPHS_PER_ENTRY)
+    sites_data = []
+    for site_index in range(NUM_SITES):
+        entries = {}
+        for entry_index in range(ENTRIES_PER_SITE):
+            timestamp = 1700000000.0 + site_index * 3600 + entry_index * 60
+            entries[str(timestamp)] = {
+                KEY_TITLE: f"Post {site_index}-{entry_index}",
+                KEY_DATETIME: timestamp,
+                KEY_URL: f"https://site{site_index}.test/posts/{entry_index}",
+                KEY_CONTENT: content,
+            }
+        sites_data.append(
+            {
+                KEY_TITLE: f"Site {site_index}",
+                KEY_CATEGORY: f"Category {site_index % 10}",
+                KEY_CATEGORY_ICON: None,
+                KEY_ENTRIES: entries,
+            }
+        )
+    return sites_data
+
+
+def main() -> None:
+    sites_data = generate_sites_data()
+
+    print(
+        "{format:>10} {serialize:>15} {size:>12} {gzip_time:>10} {gzip_size:>12} {brotli_time:>10} "
+        "{brotli_size:>12}".format(
+            format="format",
+            serialize="serialize (ms)",
+            size="bytes",
+            gzip_time="gzip (ms)",
+            gzip_size="gzip bytes",
+            brotli_time="br (ms)",
+            brotli_size="br bytes",
+        )
+    )
+    for output_format in [OUTPUT_FORMAT_INDENTED, OUTPUT_FORMAT_MINIFIED]:
+        settings = Settings(base_output_path=".")
+        settings.output_format = output_format
+        writer = Writer(settings=settings, run_stats=RunStats(), entry_store=EntryStore(settings=settings))
+
+        started = time.perf_counter()
+        serialized = [writer._serialize(site_data) for site_data in sites_data]
+        serialize_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        gzip_size = sum(len(gzip.compress(contents, mtime=0)) for contents in serialized)
+        gzip_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        brotli_size = sum(len(brotli.compress(contents, quality=BROTLI_QUALITY)) for contents in serialized)
+        brotli_time = time.perf_counter() - started
+
+        print(
+            "{format:>10} {serialize:>15.1f} {size:>12} {gzip_time:>10.1f} {gzip_size:>12} {brotli_time:>10.1f} "
+            "{brotli_size:>12}".format(
+                format=output_format,
+                serialize=serialize_time * 1000,
+                size=sum(len(contents) for contents in serialized),
+                gzip_time=gzip_time * 1000,
+                gzip_size=gzip_size,
+                brotli_time=brotli_time * 1000,
+                brotli_size=brotli_size,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+# readable by the web server serving the output folder (temporary files are created as 0o600)
+FILE_MODE = 0o644
+
+
+def write_atomically(file_path: str, contents: bytes) -> None:
+    # write to a temporary file and rename it, so readers never get a half-written file
+    temp_path = temp_path_for(file_path)
+    try:
+        with open(temp_path, "wb") as file_handle:
+            file_handle.write(contents)
+        os.chmod(temp_path, FILE_MODE)
+        os.replace(temp_path, file_path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def temp_path_for(file_path: str) -> str:
+    # same folder as the destination, as renames are only atomic within the same filesystem
+    file_handle, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_path), prefix=".{name}.".format(name=os.path.basename(file_path)), suffix=".tmp"
+    )
+    os.close(file_handle)
+    return temp_path
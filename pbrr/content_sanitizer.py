@@ -0,0 +1,55 @@
+import re
+from typing import Match
+
+# Every alternative starts with `<`, so the content is scanned once and only tags are inspected:
+# - scripts (with or without attributes), removed
+# - `img` and `a` opening tags, to lazy load images/open links in a new tab
+# - any other opening tag with a relative url or a `class="button"` attribute
+TAGS_PATTERN = re.compile(
+    r"<(?:"
+    r"script\b[^>]*>.*?</script\s*>"
+    r"|(img|a)(\s[^>]*)?>"
+    r"|([a-z][a-z0-9]*)(\s[^>]*?(?:=\"/|class=\"button\")[^>]*)>"
+    r")",
+    flags=re.I | re.S,
+)
+ATTRIBUTES_PATTERN = re.compile(r"(\s(?:href|src)=\")(/(?!/)[^\"]*\")|\sclass=\"button\"", flags=re.I)
+
+
+class ContentSanitizer:
+    def __init__(self, site_url: str) -> None:
+        self.site_url = site_url
+
+    def sanitize(self, content: str) -> str:
+        return TAGS_PATTERN.sub(self._rewrite_tag, content)
+
+    def _rewrite_tag(self, match: Match) -> str:
+        # positional groups, as this runs for most tags of every post
+        media_tag, media_attributes, tag, attributes = match.groups()
+
+        if media_tag:
+            if media_attributes is None:
+                media_attributes = ""
+            # quick check to avoid running the regex for most tags. Case-insensitive like the regex
+            elif '="/' in media_attributes or "button" in media_attributes.lower():
+                media_attributes = ATTRIBUTES_PATTERN.sub(self._rewrite_attribute, media_attributes)
+
+            if len(media_tag) == 3:
+                if "loading=" not in media_attributes:
+                    return "<" + media_tag + ' loading="lazy"' + media_attributes + ">"
+            elif "target=" not in media_attributes:
+                return "<" + media_tag + ' target="_blank"' + media_attributes + ">"
+            return "<" + media_tag + media_attributes + ">"
+
+        if tag:
+            return "<" + tag + ATTRIBUTES_PATTERN.sub(self._rewrite_attribute, attributes) + ">"
+
+        return ""
+
+    def _rewrite_attribute(self, match: Match) -> str:
+        name, path = match.groups()
+        if name:
+            # fix relative urls inside posts (e.g. Github private RSS)
+            return name + self.site_url + path
+        # break content's CSS that would otherwise render wrongly
+        return ""
@@ -0,0 +1,108 @@
+import os
+import signal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Event, Thread
+from typing import Any, Optional
+
+from pbrr.log import Log
+from pbrr.pbrr import PBRR
+from pbrr.settings import SETTINGS_FILENAME
+
+TRIGGER_HOST = "127.0.0.1"
+TRIGGER_PATH = "/refresh"
+
+
+class Daemon:
+    # keeps a single `PBRR` refreshing feeds periodically, instead of a new process (imports, connections...) per run
+    def __init__(self, reader: PBRR) -> None:
+        self.reader = reader
+        self.refresh_requested = Event()
+        self._stopping = False
+        self._trigger_server: Optional[HTTPServer] = None
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._on_stop_signal)
+
+        self.reader.start()
+        self._start_trigger_server()
+
+        try:
+            while not self._stopping:
+                self.refresh_requested.clear()
+                self._refresh()
+                # refreshes save the settings, so only later changes (e.g. manual edits) count
+                settings_mtime = self._settings_mtime()
+
+                Log.info("> Next refresh in {minutes} min".format(minutes=self.reader.settings.daemon_refresh_minutes))
+                self.refresh_requested.wait(timeout=self.reader.settings.daemon_refresh_minutes * 60)
+
+                if not self._stopping and self._settings_mtime() != settings_mtime:
+                    self._reload()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            Log.info("> Stopping")
+            self._stop_trigger_server()
+            self.reader.stop()
+
+    def _refresh(self) -> None:
+        # a failed refresh (e.g. network storage down, an OPML file being saved) must not end the daemon.
+        # `SystemExit` too, as some errors are reported with `Log.error_and_exit`
+        try:
+            self.reader.refresh()
+        except (Exception, SystemExit) as e:
+            Log.warn("Refresh failed, retrying at the next one. Error: {error}".format(error=repr(e)))
+
+    def _reload(self) -> None:
+        Log.info(f"> '{SETTINGS_FILENAME}' changed, reloading")
+        self._stop_trigger_server()
+        self.reader.stop()
+        try:
+            self.reader.start()
+        except (Exception, SystemExit) as e:
+            # e.g. invalid settings. Refreshes fail until the file is fixed, which triggers another reload
+            Log.warn("Reload failed. Error: {error}".format(error=repr(e)))
+            return
+        self._start_trigger_server()
+
+    def _on_stop_signal(self, signal_number: int, frame: Any) -> None:
+        # any ongoing refresh finishes first
+        self._stopping = True
+        self.refresh_requested.set()
+
+    def _settings_mtime(self) -> Optional[int]:
+        file_path = os.path.join(self.reader.data_path, SETTINGS_FILENAME)
+        return os.stat(file_path).st_mtime_ns if os.path.exists(file_path) else None
+
+    def _start_trigger_server(self) -> None:
+        port = self.reader.settings.daemon_trigger_port
+        if not port:
+            return
+
+        refresh_requested = self.refresh_requested
+
+        class TriggerHandler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if self.path != TRIGGER_PATH:
+                    self.send_error(404)
+                    return
+                Log.info("> Refresh requested ({client})".format(client=self.client_address[0]))
+                refresh_requested.set()
+                self.send_response(202)
+                self.end_headers()
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # no access logs between the fetch logs
+                pass
+
+        # only reachable from the same machine
+        self._trigger_server = HTTPServer((TRIGGER_HOST, port), TriggerHandler)
+        Thread(target=self._trigger_server.serve_forever, daemon=True).start()
+        Log.info(f"> Listening for refresh requests at http://{TRIGGER_HOST}:{port}{TRIGGER_PATH}")
+
+    def _stop_trigger_server(self) -> None:
+        if self._trigger_server is None:
+            return
+        self._trigger_server.shutdown()
+        self._trigger_server.server_close()
+        self._trigger_server = None
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Optional
+
+from pbrr.log import Log
+from pbrr.parsed_feed_item import ParsedFeedItem
+from pbrr.parsed_feed_site import ParsedFeedSite
+from pbrr.settings import Settings
+
+ENTRY_STORE_FILENAME = "entries.sqlite"
+# sites not fetched for this long (e.g. removed from the OPML) get deleted along with their entries
+STALE_SITE_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    category TEXT,
+    link TEXT,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    site_id TEXT NOT NULL REFERENCES sites (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    link TEXT NOT NULL,
+    published REAL NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (site_id, id)
+);
+CREATE INDEX IF NOT EXISTS entries_by_site ON entries (site_id, published DESC);
+CREATE INDEX IF NOT EXISTS entries_by_date ON entries (published DESC);
+"""
+
+
+class StoredEntry(NamedTuple):
+    site_id: str
+    id: str
+    title: str
+    link: str
+    published: float
+    content: str
+
+
+class EntryStore:
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        os.makedirs(self.settings.base_output_path, exist_ok=True)
+        file_path = os.path.join(self.settings.base_output_path, ENTRY_STORE_FILENAME)
+
+        try:
+            self._connect(file_path)
+        except sqlite3.DatabaseError:
+            # a corrupted store only means starting again from what feeds currently have
+            Log.warn(f"Ignoring malformed '{ENTRY_STORE_FILENAME}'")
+            self.close()
+            os.remove(file_path)
+            self._connect(file_path)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def merge(self, site: ParsedFeedSite, entries: List[ParsedFeedItem]) -> bool:
+        # adds new entries of the site and updates the known ones. Returns if anything changed
+        connection = self._connection()
+        changes_before = connection.total_changes
+
+        with connection:
+            connection.execute(
+                "INSERT INTO sites (id, title, category, link, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET category = excluded.category, "
+                "link = COALESCE(excluded.link, link), last_seen = excluded.last_seen",
+                (site.id, site.title, site.category, site.link, time.time()),
+            )
+            # only the `last_seen` update, which doesn't alter the output
+            changes_before += 1
+
+            for entry in entries:
+                entry_id = entry.id
+                published = entry.published.timestamp()
+                # an edited title changes the id, so drop the previous version of the same post
+                connection.execute(
+                    "DELETE FROM entries WHERE site_id = ? AND link = ? AND published = ? AND id != ?",
+                    (site.id, entry.link, published, entry_id),
+                )
+                # reposts keep their original date, so they don't jump back to the top
+                connection.execute(
+                    "INSERT INTO entries (site_id, id, title, link, published, content) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (site_id, id) DO UPDATE SET content = excluded.content, "
+                    "published = MIN(published, excluded.published) "
+                    "WHERE content != excluded.content OR published > excluded.published",
+                    (site.id, entry_id, entry.title, entry.link, published, entry.content),
+                )
+
+            self._trim_site(site)
+
+        return connection.total_changes > changes_before
+
+    def has_entries(self, site: ParsedFeedSite) -> bool:
+        row = self._connection().execute("SELECT 1 FROM entries WHERE site_id = ? LIMIT 1", (site.id,)).fetchone()
+        return row is not None
+
+    def site_entries(self, site: ParsedFeedSite) -> List[StoredEntry]:
+        rows = self._connection().execute(
+            "SELECT site_id, id, title, link, published, content FROM entries WHERE site_id = ? ORDER BY published DESC",
+            (site.id,),
+        )
+        return [StoredEntry(*row) for row in rows]
+
+    def entries_by_date(self) -> Iterator[StoredEntry]:
+        # most recent first, straight from the index instead of loading & sorting all entries
+        rows = self._connection().execute(
+            "SELECT site_id, id, title, link, published, content FROM entries ORDER BY published DESC"
+        )
+        for row in rows:
+            yield StoredEntry(*row)
+
+    def sites(self) -> List[ParsedFeedSite]:
+        rows = self._connection().execute("SELECT title, category, link FROM sites ORDER BY title")
+        return [ParsedFeedSite(title=title, category=category, link=link) for title, category, link in rows]
+
+    def prune_stale_sites(self) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM sites WHERE last_seen < ?", (time.time() - STALE_SITE_DAYS * 24 * 60 * 60,))
+
+    def _trim_site(self, site: ParsedFeedSite) -> None:
+        # same limits as when parsing a feed, but applied over all entries ever kept
+        connection = self._connection()
+        connection.execute(
+            "DELETE FROM entries WHERE site_id = ? AND id NOT IN "
+            "(SELECT id FROM entries WHERE site_id = ? ORDER BY published DESC LIMIT ?)",
+            (site.id, site.id, self.settings.num_entries_per_feed),
+        )
+
+        # filters added after an entry got stored must also hide it, even if the feed isn't parsed again
+        if self.settings.skip_filters or self.settings.skip_regex_filters:
+            rows = connection.execute("SELECT id, title FROM entries WHERE site_id = ?", (site.id,))
+            skipped_ids = [(site.id, id) for id, title in rows if self.settings.skip_filters_matcher.matches(title)]
+            connection.executemany("DELETE FROM entries WHERE site_id = ? AND id = ?", skipped_ids)
+
+        if self.settings.entry_max_age_months:
+            min_post_datetime = datetime.now() - timedelta(days=self.settings.entry_max_age_months * 30)
+            connection.execute(
+                "DELETE FROM entries WHERE site_id = ? AND published < ?", (site.id, min_post_datetime.timestamp())
+            )
+
+    def _connect(self, file_path: str) -> None:
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self.connection is None:
+            raise ValueError("Entry store not opened")
+        return self.connection
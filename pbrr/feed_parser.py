@@ -0,0 +1,244 @@
+import time
+from datetime import datetime, timedelta
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from colorama import deinit
+
+from pbrr.content_sanitizer import ContentSanitizer
+from pbrr.log import Log
+from pbrr.parsed_feed_item import ParsedFeedItem
+from pbrr.parsed_feed_site import ParsedFeedSite
+from pbrr.settings import Settings
+
+ONE_MONTH_IN_SECONDS = 60 * 60 * 24 * 30
+
+
+class EntryCandidate(NamedTuple):
+    # the fields needed to decide if an entry is kept, cheap to extract compared to its content
+    title: str
+    published: datetime
+    entry: Any
+
+
+class ParsedFeed(NamedTuple):
+    site: ParsedFeedSite
+    entries: List[ParsedFeedItem]
+    entries_discarded: int
+    # seconds spent by feedparser, and selecting & sanitizing the entries to keep
+    parse_time: float
+    sanitize_time: float
+
+
+class FeedParser:
+    # CPU-bound part of fetching a feed, from the response body to the entries to keep. Only needs the settings, so
+    # it can also run at a separate process
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+
+    def parse(
+        self, url: str, title: Optional[str], category: Optional[str], status_code: int, body: bytes
+    ) -> ParsedFeed:
+        # imported on first use, as runs where no feed changed don't need it
+        import feedparser
+
+        parse_started = time.monotonic()
+        try:
+            source_site = feedparser.parse(body.decode("utf-8", errors="replace"))
+        except Exception as e:
+            Log.warn("{title} ({url}) skipped. Error: {error}".format(title=title, url=url, error=e))
+            raise ValueError(str(e))
+
+        sanitize_started = time.monotonic()
+        self._log_and_error_if_proceeds(url=url, title=title, source_site=source_site, response_status_code=status_code)
+        parsed_site, parsed_entries = self._parse_feed(source_site=source_site, title=title, category=category)
+
+        return ParsedFeed(
+            site=parsed_site,
+            entries=parsed_entries,
+            entries_discarded=len(source_site.entries) - len(parsed_entries),
+            parse_time=sanitize_started - parse_started,
+            sanitize_time=time.monotonic() - sanitize_started,
+        )
+
+    def _parse_feed(
+        self, source_site: Any, title: Optional[str], category: Optional[str]
+    ) -> Tuple[ParsedFeedSite, List[ParsedFeedItem]]:
+        parsed_site = self._parse_site(feed=source_site.feed, provided_title=title, category=category)
+
+        # first decide which entries are kept using only cheap fields, then parse the content of those
+        entries_count = len(source_site.entries)
+        candidates = [
+            EntryCandidate(
+                title=entry.title,
+                published=self._published_field_from(
+                    entry=entry, entry_index=index, entry_reverse_index=(entries_count - index - 1)
+                ),
+                entry=entry,
+            )
+            for index, entry in enumerate(source_site.entries)
+        ]
+
+        if candidates:
+            candidates = self._skip_entries(candidates)
+            candidates = self._filter_entries(candidates)
+
+        parsed_entries = [
+            self._parse_entry(entry=candidate.entry, parsed_site=parsed_site, published=candidate.published)
+            for candidate in candidates
+        ]
+
+        return parsed_site, parsed_entries
+
+    def _skip_entries(self, entries: List[EntryCandidate]) -> List[EntryCandidate]:
+        return [entry for entry in entries if not self.settings.skip_filters_matcher.matches(entry.title)]
+
+    def _filter_entries(self, entries: List[EntryCandidate]) -> List[EntryCandidate]:
+        # reorder by most recent first (seen inverse order)
+        entries = sorted(entries, key=lambda s: (s.published), reverse=True)
+        # cut to a reasonable limit (seen also feeds with full dumps of content)
+        entries = entries[: self.settings.num_entries_per_feed]
+
+        if not self.settings.entry_max_age_months:
+            return entries
+
+        min_post_datetime = datetime.now() - timedelta(days=self.settings.entry_max_age_months * 30)
+
+        return [entry for entry in entries if entry.published >= min_post_datetime]
+
+    @staticmethod
+    def _log_and_error_if_proceeds(url: str, title: Optional[str], source_site: Any, response_status_code: int) -> None:
+        # just warn, don't skip
+        if "bozo" in source_site.keys() and source_site["bozo"] == 1 and response_status_code != 200:
+            Log.info(
+                "{title} ({url}) bozo=1 http_status:{status}".format(title=title, url=url, status=response_status_code)
+            )
+
+        # should always skip by raising error
+        if (
+            not source_site.feed.keys()
+            or "link" not in source_site.feed.keys()
+            or response_status_code in [401, 403, 404]
+        ):
+            Log.warn_and_raise_error(
+                "{title} ({url}) skipped, feed malformed/not retrieved. HTTPStatus: {status}".format(
+                    title=title,
+                    url=url,
+                    status=response_status_code,
+                )
+            )
+
+        if response_status_code in [301]:
+            Log.warn(
+                "{title} ({url}) has moved ({status}) Check new URL".format(
+                    title=title, url=url, status=response_status_code
+                )
+            )
+
+        if response_status_code in [410]:
+            Log.warn_and_raise_error(
+                "{title} ({url}) skipped, received http_status:{status} Url gone".format(
+                    title=title, url=url, status=response_status_code
+                )
+            )
+
+    @classmethod
+    def site_without_feed(cls, title: Optional[str], category: Optional[str]) -> ParsedFeedSite:
+        # e.g. not modified feeds, whose site data is kept as it is
+        return cls._parse_site(feed=None, provided_title=title, category=category)
+
+    @classmethod
+    def _parse_site(cls, feed: Optional[Any], provided_title: Optional[str], category: Optional[str]) -> ParsedFeedSite:
+        return ParsedFeedSite(
+            title=cls._sanitize_site_title(feed=feed, provided_title=provided_title),
+            category=category,
+            link=feed.link if feed else None,
+        )
+
+    @classmethod
+    def _parse_entry(cls, entry: Any, parsed_site: ParsedFeedSite, published: datetime) -> ParsedFeedItem:
+        content = ""
+        content_key = None
+        is_array = False
+
+        # seen some entries on same site with and without summary_detail, so can't just sample and apply to all
+        if "content" in entry.keys():
+            content_key = "content"
+            is_array = True
+        elif "summary_detail" in entry.keys():
+            content_key = "summary_detail"
+        elif "title_detail" in entry.keys():
+            content_key = "title_detail"
+
+        if content_key:
+            if is_array:
+                content_by_type = [content.value for content in entry[content_key] if content.type == "text/html"]
+                if not content_by_type:
+                    content_by_type = [content.value for content in entry[content_key] if content.type == "text/plain"]
+                content = content_by_type[0] if content_by_type else ""
+            else:
+                content = entry[content_key].value
+
+        site_url = "https://{site}".format(
+            site=parsed_site.link.replace("https://", "").replace("http://", "").split("/")[0]
+        )
+
+        # Some blogs return relative urls as the entry link (and some report site base url as non-https)
+        entry_link = entry.link
+        if entry_link[:1] == "/":
+            entry_link = "{site}{entry}".format(site=site_url, entry=entry.link)
+
+        content = ContentSanitizer(site_url=site_url).sanitize(content)
+
+        return ParsedFeedItem(
+            title=entry.title, link=entry_link, published=published, content=content, parent=parsed_site
+        )
+
+    @staticmethod
+    def _published_field_from(entry: Any, entry_index: int, entry_reverse_index: int) -> datetime:
+        published = None
+
+        if "published" in entry.keys():
+            published = entry.published_parsed if "published_parsed" in entry.keys() else entry.published
+        elif "updated" in entry.keys():
+            published = entry.updated_parsed if "updated_parsed" in entry.keys() else entry.updated
+
+        if not published:
+            # fake a post time to avoid collisions when generating files
+            published = time.gmtime(time.mktime(time.gmtime()) - (entry_index * ONE_MONTH_IN_SECONDS))
+            # change the time-tuple day to the 1st of the month (so they don't always appear as recent/new)
+            published = published[:2] + (1,) + published[3:]
+
+        published_datetime = datetime.fromtimestamp(time.mktime(published))
+        # use seconds as a way to differentiate each entry, so if two are published at the same time, don't collide
+        published_datetime = published_datetime + timedelta(seconds=entry_reverse_index)
+
+        return published_datetime
+
+    @staticmethod
+    def _sanitize_site_title(feed: Any, provided_title: Optional[str]) -> str:
+        if provided_title:
+            return provided_title
+        elif not feed or "title" not in feed.keys():
+            return "untitled{ts}".format(ts=time.time_ns())
+        else:
+            return feed.title.encode("utf-8", errors="ignore").decode()
+
+
+# each process of the parsing pool keeps its own `FeedParser`, so settings are only sent once per process
+_worker_feed_parser: Optional[FeedParser] = None
+
+
+def init_parse_worker(settings: Settings) -> None:
+    global _worker_feed_parser
+    # colorama's wrapped stdout writes each line in pieces, which would get mixed with lines of other processes
+    deinit()
+    _worker_feed_parser = FeedParser(settings=settings)
+
+
+def parse_in_worker(
+    url: str, title: Optional[str], category: Optional[str], status_code: int, body: bytes
+) -> ParsedFeed:
+    if _worker_feed_parser is None:
+        raise ValueError("Parse worker not initialized")
+    return _worker_feed_parser.parse(url=url, title=title, category=category, status_code=status_code, body=body)
@@ -0,0 +1,116 @@
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Mapping, Optional
+
+from pbrr.json_state import JsonState
+from pbrr.parsed_feed_item import ParsedFeedItem
+from pbrr.settings import Settings
+
+SCHEDULE_FILENAME = "schedule.json"
+# epoch seconds of the last successful fetch and of the moment the feed should be fetched again
+KEY_LAST_SUCCESS = "last_success"
+KEY_NEXT_FETCH = "next_fetch"
+# consecutive failed fetches
+KEY_FAILURES = "failures"
+# seconds between refreshes, adapted to the feed's observed posting cadence
+KEY_REFRESH_INTERVAL = "refresh_interval"
+
+# a feed is refreshed this many times per observed interval between posts
+REFRESHES_PER_POST_INTERVAL = 4
+# cron runs are never exactly on time
+DUE_TOLERANCE_SECONDS = 60
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)", flags=re.I)
+
+
+class FeedScheduler(JsonState):
+    def __init__(self, settings: Settings) -> None:
+        super().__init__(settings.base_output_path, SCHEDULE_FILENAME)
+        self.settings = settings
+        # all schedules are relative to the start of the run, so the next run isn't delayed by how long this one took
+        self.run_started_at = time.time()
+
+    def start_run(self) -> None:
+        # a long-running process does many runs with the same scheduler
+        self.run_started_at = time.time()
+
+    @property
+    def min_interval(self) -> float:
+        return self.settings.min_refresh_minutes * 60
+
+    @property
+    def max_interval(self) -> float:
+        return self.settings.max_refresh_hours * 60 * 60
+
+    def is_due(self, url: str) -> bool:
+        if not self.settings.adaptive_refresh:
+            return True
+
+        with self._lock:
+            next_fetch = self.entries.get(url, {}).get(KEY_NEXT_FETCH, 0)
+        return next_fetch - DUE_TOLERANCE_SECONDS <= self.run_started_at
+
+    def is_failing(self, url: str) -> bool:
+        with self._lock:
+            return self.entries.get(url, {}).get(KEY_FAILURES, 0) > 0
+
+    def seconds_until_due(self, url: str) -> float:
+        with self._lock:
+            return max(0, self.entries.get(url, {}).get(KEY_NEXT_FETCH, 0) - self.run_started_at)
+
+    def record_success(
+        self, url: str, entries: Optional[List[ParsedFeedItem]], response_headers: Mapping[str, str]
+    ) -> None:
+        # `None` entries means not modified, which tells nothing new about the posting cadence
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            interval = self._posting_interval(entries) if entries else None
+            if interval is None:
+                interval = entry.get(KEY_REFRESH_INTERVAL, self.min_interval)
+
+            interval = min(max(interval, self.min_interval), self.max_interval)
+            delay = max(interval, min(self._max_age(response_headers), self.max_interval))
+
+            entry[KEY_REFRESH_INTERVAL] = interval
+            entry[KEY_LAST_SUCCESS] = self.run_started_at
+            entry[KEY_FAILURES] = 0
+            entry[KEY_NEXT_FETCH] = self.run_started_at + delay
+
+    def record_failure(self, url: str, response_headers: Optional[Mapping[str, str]] = None) -> None:
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            failures = entry.get(KEY_FAILURES, 0) + 1
+            # exponential backoff: 1x, 2x, 4x... the minimum interval
+            backoff = min(self.min_interval * 2 ** (failures - 1), self.max_interval)
+            retry_after = self._retry_after(response_headers) if response_headers is not None else 0
+
+            entry[KEY_FAILURES] = failures
+            entry[KEY_NEXT_FETCH] = self.run_started_at + max(backoff, retry_after)
+
+    @staticmethod
+    def _posting_interval(entries: List[ParsedFeedItem]) -> Optional[float]:
+        if len(entries) < 2:
+            return None
+
+        timestamps = sorted(entry.published.timestamp() for entry in entries)
+        average_gap = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
+        return average_gap / REFRESHES_PER_POST_INTERVAL
+
+    @staticmethod
+    def _max_age(response_headers: Mapping[str, str]) -> float:
+        match = MAX_AGE_PATTERN.search(response_headers.get("Cache-Control", ""))
+        return int(match.group(1)) if match else 0
+
+    def _retry_after(self, response_headers: Mapping[str, str]) -> float:
+        # either a number of seconds or an http date
+        value = response_headers.get("Retry-After", "").strip()
+        if not value:
+            return 0
+        if value.isdigit():
+            return int(value)
+
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - self.run_started_at)
+        except (TypeError, ValueError):
+            return 0
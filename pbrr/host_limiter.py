@@ -0,0 +1,20 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+from urllib.parse import urlparse
+
+
+class HostLimiter:
+    def __init__(self, max_per_host: int) -> None:
+        self.max_per_host = max(1, max_per_host)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        # blocks while there are already `max_per_host` requests in flight against the same host
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.Semaphore(self.max_per_host))
+        with semaphore:
+            yield
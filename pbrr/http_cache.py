@@ -0,0 +1,62 @@
+import time
+from typing import Dict, Mapping, Optional
+
+from pbrr.json_state import JsonState
+
+HTTP_CACHE_FILENAME = "http-cache.json"
+# validators sent back as `If-None-Match` / `If-Modified-Since` so the server can reply with a 304
+KEY_ETAG = "etag"
+KEY_LAST_MODIFIED = "last_modified"
+# last http status received and when (epoch seconds)
+KEY_STATUS = "status"
+KEY_FETCHED_AT = "fetched_at"
+# site title resolved on the last full fetch, so a 304 keeps pointing to the same site data file
+KEY_TITLE = "title"
+# hash of the last successfully parsed body, for servers replying 200 with the same body instead of a 304
+KEY_BODY_HASH = "body_hash"
+
+
+class HttpCache(JsonState):
+    def __init__(self, base_output_path: str) -> None:
+        super().__init__(base_output_path, HTTP_CACHE_FILENAME)
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        with self._lock:
+            entry = self.entries.get(url, {})
+
+        headers = {}
+        if entry.get(KEY_ETAG):
+            headers["If-None-Match"] = entry[KEY_ETAG]
+        if entry.get(KEY_LAST_MODIFIED):
+            headers["If-Modified-Since"] = entry[KEY_LAST_MODIFIED]
+        return headers
+
+    def record(
+        self,
+        url: str,
+        status_code: int,
+        response_headers: Optional[Mapping[str, str]] = None,
+        title: Optional[str] = None,
+        body_hash: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            entry = self.entries.setdefault(url, {})
+            entry[KEY_STATUS] = status_code
+            entry[KEY_FETCHED_AT] = time.time()
+
+            # only full, successfully parsed responses provide validators
+            if response_headers is not None:
+                entry[KEY_ETAG] = response_headers.get("ETag")
+                entry[KEY_LAST_MODIFIED] = response_headers.get("Last-Modified")
+            if title:
+                entry[KEY_TITLE] = title
+            if body_hash:
+                entry[KEY_BODY_HASH] = body_hash
+
+    def cached_title(self, url: str) -> Optional[str]:
+        with self._lock:
+            return self.entries.get(url, {}).get(KEY_TITLE)
+
+    def cached_body_hash(self, url: str) -> Optional[str]:
+        with self._lock:
+            return self.entries.get(url, {}).get(KEY_BODY_HASH)
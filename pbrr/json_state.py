@@ -0,0 +1,48 @@
+import json
+import os
+from threading import Lock
+from typing import Any, Dict, Iterable
+
+from pbrr.atomic_file import write_atomically
+from pbrr.log import Log
+
+
+class JsonState:
+    # per-key state kept across runs as a JSON file at the output folder (HTTP cache, schedule, OPML cache...)
+    def __init__(self, base_output_path: str, filename: str) -> None:
+        self.base_output_path = base_output_path
+        self.filename = filename
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = Lock()
+
+    def load(self) -> None:
+        file_path = os.path.join(self.base_output_path, self.filename)
+        if not os.path.exists(file_path):
+            return
+
+        try:
+            with open(file_path, "r", encoding="utf8") as file_handle:
+                self.entries = json.load(file_handle)
+        except ValueError:
+            # a corrupted state file only means starting from scratch (fetching or parsing everything again)
+            Log.warn(f"Ignoring malformed '{self.filename}'")
+            self.entries = {}
+
+    def save(self) -> None:
+        if not os.path.exists(self.base_output_path):
+            Log.error_and_exit(f"Output path '{self.base_output_path}' not found")
+
+        with self._lock:
+            contents = json.dumps(self.entries, indent=None).encode("utf8")
+        # a crash while saving keeps the previous file instead of leaving a truncated one
+        write_atomically(os.path.join(self.base_output_path, self.filename), contents)
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def prune(self, keys: Iterable[str]) -> None:
+        # drop what is no longer present (e.g. feeds removed from the OPML)
+        keep = set(keys)
+        with self._lock:
+            self.entries = {key: entry for key, entry in self.entries.items() if key in keep}
@@ -1,16 +1,22 @@
+from threading import Lock
+
 from colorama import Fore, Style, deinit
 
+# feeds are fetched from multiple threads, avoid interleaving lines. Parse worker processes don't share the lock, but
+# a whole line written at once doesn't get mixed with others
+_print_lock = Lock()
+
 
 class Log:
     @staticmethod
     def error_and_exit(message: str) -> None:
-        print(Fore.RED + message + Style.RESET_ALL)
+        Log._print(Fore.RED + message + Style.RESET_ALL)
         deinit()
         exit(1)
 
     @staticmethod
     def warn(message: str) -> None:
-        print(Fore.YELLOW + message + Style.RESET_ALL)
+        Log._print(Fore.YELLOW + message + Style.RESET_ALL)
 
     @staticmethod
     def warn_and_raise_error(message: str) -> None:
@@ -19,4 +25,9 @@ class Log:
 
     @staticmethod
     def info(message: str) -> None:
-        print(Style.DIM + Fore.WHITE + message + Style.RESET_ALL)
+        Log._print(Style.DIM + Fore.WHITE + message + Style.RESET_ALL)
+
+    @staticmethod
+    def _print(message: str) -> None:
+        with _print_lock:
+            print(message + "\n", end="", flush=True)
@@ -0,0 +1,110 @@
+import os
+from typing import List, Optional, Set, Tuple
+
+from pbrr.json_state import JsonState
+from pbrr.log import Log
+from pbrr.settings import Settings
+
+# sites of each OPML file, reused while the file's modification time & size don't change
+OPML_CACHE_FILENAME = "opml-cache.json"
+KEY_MTIME = "mtime"
+KEY_SIZE = "size"
+KEY_SITES = "sites"
+
+# feed url, title and category
+SiteMetadata = Tuple[str, Optional[str], Optional[str]]
+
+
+class OpmlReader:
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.cache = JsonState(settings.base_output_path, OPML_CACHE_FILENAME)
+        self._cache_loaded = False
+
+    def read(self, opml_filenames: List[str]) -> List[SiteMetadata]:
+        self._load_cache()
+        cache_changed = False
+
+        sites: List[SiteMetadata] = []
+        seen_urls: Set[str] = set()
+
+        for opml_filename in opml_filenames:
+            opml_filepath = os.path.join(self.settings.base_output_path, opml_filename)
+            if not os.path.exists(opml_filepath):
+                Log.error_and_exit("OPML file '{}' not found".format(opml_filepath))
+
+            stat = os.stat(opml_filepath)
+            cached = self.cache.entries.get(opml_filename)
+            if cached and cached[KEY_MTIME] == stat.st_mtime_ns and cached[KEY_SIZE] == stat.st_size:
+                file_sites = [(url, title, category) for url, title, category in cached[KEY_SITES]]
+            else:
+                file_sites = self._parse(opml_filepath)
+                self.cache.entries[opml_filename] = {
+                    KEY_MTIME: stat.st_mtime_ns,
+                    KEY_SIZE: stat.st_size,
+                    KEY_SITES: file_sites,
+                }
+                cache_changed = True
+
+            # when merging multiple files, the first appearance of a feed wins
+            for site in file_sites:
+                if site[0] in seen_urls or self.settings.skip_urls_matcher.matches(site[0]):
+                    continue
+                seen_urls.add(site[0])
+                sites.append(site)
+
+        if set(self.cache.entries.keys()) != set(opml_filenames):
+            self.cache.prune(opml_filenames)
+            cache_changed = True
+
+        if cache_changed:
+            self.cache.save()
+
+        return sites
+
+    @staticmethod
+    def _parse(opml_filepath: str) -> List[SiteMetadata]:
+        # only needed when the cache is outdated
+        from lxml import etree
+
+        sites: List[SiteMetadata] = []
+        # title of each currently open outline, the last one being the category of the sites it contains
+        outline_titles: List[Optional[str]] = []
+        in_body = False
+
+        try:
+            # streamed, without building the whole tree. `recover` to be as lenient as a browser with broken files
+            for event, element in etree.iterparse(opml_filepath, events=("start", "end"), recover=True):
+                tag = etree.QName(element).localname
+
+                if event == "start":
+                    if tag == "body":
+                        in_body = True
+                    elif tag == "outline":
+                        if in_body and element.get("xmlUrl") is not None and element.get("type", "") == "rss":
+                            category = outline_titles[-1] if outline_titles else None
+                            sites.append((element.get("xmlUrl"), element.get("title"), category))
+                        outline_titles.append(element.get("title"))
+                    continue
+
+                if tag == "outline":
+                    outline_titles.pop()
+                elif tag == "body":
+                    in_body = False
+                # already processed, free the memory. The root's previous siblings are top-level comments or processing
+                # instructions, which have no parent to be deleted from
+                element.clear()
+                if element.getparent() is not None:
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+        except etree.XMLSyntaxError as e:
+            Log.error_and_exit("OPML file '{}' malformed: {}".format(opml_filepath, e))
+
+        return sites
+
+    def _load_cache(self) -> None:
+        # only from disk the first time, later reads reuse the cache in memory
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        self.cache.load()
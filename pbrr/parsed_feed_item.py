@@ -5,6 +5,9 @@ from pbrr.parsed_feed_site import ParsedFeedSite
 
 
 class ParsedFeedItem:
+    # no per-instance `__dict__`, as there can be tens of thousands of entries per run
+    __slots__ = ("title", "link", "published", "content", "parent")
+
     def __init__(self, title: str, link: str, published: datetime, content: str, parent: ParsedFeedSite) -> None:
         self.title = title
         self.link = link
@@ -23,14 +26,25 @@ class ParsedFeedItem:
 
     @property
     def id(self) -> str:
+        # not kept: read once when merged into the entry store, and a cached hex id per entry (~90 bytes) would cost
+        # more memory than the slots save
+        return self.id_for(self.link, self.title)
+
+    @property
+    def html_filename(self) -> str:
+        return self.html_filename_for(self.published.timestamp(), self.id)
+
+    @staticmethod
+    def id_for(link: str, title: str) -> str:
         hashAlgoritm = hashlib.md5()
         # Because some feeds contain non-unique links (e.g. Github activity RSS points to repositories)
-        hashAlgoritm.update(str.encode(self.link + self.title))
+        hashAlgoritm.update(str.encode(link + title))
         return hashAlgoritm.hexdigest()
 
-    @property
-    def html_filename(self) -> str:
-        return "{ts}_{id}.html".format(ts=self.date_for_filename, id=self.id)
+    @staticmethod
+    def html_filename_for(timestamp: float, id: str) -> str:
+        # also used for entries read back from the entry store, which are no longer `ParsedFeedItem`s
+        return "{ts}_{id}.html".format(ts=int(timestamp), id=id)
 
     @property
     def date_for_filename(self) -> str:
@@ -3,10 +3,14 @@ from typing import Optional
 
 
 class ParsedFeedSite:
+    # no per-instance `__dict__`, as there's one instance per fetched site
+    __slots__ = ("title", "link", "category", "_id")
+
     def __init__(self, title: str, category: Optional[str], link: str) -> None:
         self.title = title
         self.link = link
         self.category = category
+        self._id: Optional[str] = None
 
     def __str__(self) -> str:
         return "ParsedFeedSite: {title} - {category} ({link})".format(
@@ -15,10 +19,17 @@ class ParsedFeedSite:
 
     @property
     def id(self) -> str:
-        hashAlgoritm = hashlib.md5()
-        hashAlgoritm.update(str.encode(self.title))
-        return hashAlgoritm.hexdigest()
+        # computed on first use only, then kept, as the writer & the entry store read it many times
+        if self._id is None:
+            self._id = self.id_for(self.title)
+        return self._id
 
     @property
     def title_for_filename(self) -> str:
         return self.id
+
+    @staticmethod
+    def id_for(title: str) -> str:
+        hashAlgoritm = hashlib.md5()
+        hashAlgoritm.update(str.encode(title))
+        return hashAlgoritm.hexdigest()
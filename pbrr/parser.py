@@ -1,19 +1,35 @@
-import os
-import re
+import hashlib
+import json
+import multiprocessing
+import socket
 import time
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple, Union
-
-import feedparser
-import requests
-from bs4 import BeautifulSoup
-
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple, Union
+
+from pbrr.feed_parser import FeedParser, ParsedFeed, init_parse_worker, parse_in_worker
+from pbrr.feed_scheduler import FeedScheduler
+from pbrr.host_limiter import HostLimiter
+from pbrr.http_cache import HttpCache
 from pbrr.log import Log
 from pbrr.parsed_feed_item import ParsedFeedItem
 from pbrr.parsed_feed_site import ParsedFeedSite
+from pbrr.run_stats import (
+    OUTCOME_FAILED,
+    OUTCOME_FETCHED,
+    OUTCOME_NOT_DUE,
+    OUTCOME_NOT_MODIFIED,
+    OUTCOME_UNCHANGED,
+    RunStats,
+)
 from pbrr.settings import Settings
 
-ONE_MONTH_IN_SECONDS = 60 * 60 * 24 * 30
+if TYPE_CHECKING:
+    import requests
+
+USER_AGENT = "pbrr/2.0 (https://github.com/Kartones/pbrr)"
+RESPONSE_CHUNK_SIZE = 64 * 1024
 
 
 class Parser:
@@ -21,58 +37,114 @@ class Parser:
     KEY_SITE = "site"
     KEY_ENTRIES = "entries"
     KEY_CATEGORY = "category"
-
-    def __init__(self, settings: Settings) -> None:
+    KEY_NOT_MODIFIED = "not_modified"
+
+    def __init__(
+        self,
+        settings: Settings,
+        http_cache: HttpCache,
+        scheduler: FeedScheduler,
+        run_stats: RunStats,
+        parse_workers: int = 0,
+    ) -> None:
         self.settings = settings
-
-    def fetch_sites_metadata(self, opml_filename: str) -> List[Tuple[str, Optional[str], Optional[str]]]:
-        opml_filepath = os.path.join(self.settings.base_output_path, opml_filename)
-
-        def site_outline(element: Any) -> bool:
-            return all(
-                [
-                    element.name == "outline",
-                    element.has_attr("xmlUrl"),
-                    element.has_attr("type"),
-                    element.get("type", "") == "rss",
-                ]
+        self.http_cache = http_cache
+        self.scheduler = scheduler
+        self.run_stats = run_stats
+        self.host_limiter = HostLimiter(max_per_host=settings.max_connections_per_host)
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = Lock()
+        # responses being downloaded, so their sockets can be shut down at the run deadline
+        self._open_responses: Set["requests.Response"] = set()
+        self._open_responses_lock = Lock()
+        # monotonic time after which any ongoing download is aborted. `None` means no limit
+        self.deadline: Optional[float] = None
+        self.feed_parser = FeedParser(settings=settings)
+        self._parse_settings_key = json.dumps(
+            [
+                settings.skip_filters,
+                settings.skip_regex_filters,
+                settings.num_entries_per_feed,
+                settings.entry_max_age_months,
+            ]
+        ).encode("utf8")
+        # feedparser & sanitizing are CPU-bound, so they can run at a pool of processes instead of the fetching threads
+        self.parse_executor: Optional[ProcessPoolExecutor] = None
+        if parse_workers > 0:
+            # workers start at the first submit, from a fetching thread. Forking there would copy locks (e.g. `Log`'s)
+            # held by other threads, deadlocking the worker, so they are started from scratch instead
+            self.parse_executor = ProcessPoolExecutor(
+                max_workers=parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_parse_worker,
+                initargs=(settings,),
             )
 
-        def site_category(element: Any) -> Optional[str]:
-            parent = element.findParent()
-            if parent.name == "outline" and parent.has_attr("title"):
-                return parent.get("title")
-            else:
-                return None
-
-        if not os.path.exists(opml_filepath):
-            Log.error_and_exit("OPML file '{}' not found".format(opml_filepath))
-
-        with open(opml_filepath, encoding="utf-8") as opml_file_handle:
-            xml_contents = opml_file_handle.read()
-        soup = BeautifulSoup(xml_contents, "xml")
-        sites = soup.opml.body.findAll(site_outline)
-
-        return [
-            (site["xmlUrl"], site.get("title"), site_category(site))
-            for site in sites
-            if not any([True for skip_url in self.settings.skip_urls if site["xmlUrl"].startswith(skip_url)])
-        ]
+    @property
+    def session(self) -> "requests.Session":
+        # built at the first fetch, so runs without any due feed don't even import `requests`
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._build_session()
+            return self._session
+
+    def abort_requests(self) -> None:
+        # a slow download blocks its thread at the socket read, and the process waits for all threads before exiting
+        with self._open_responses_lock:
+            for response in self._open_responses:
+                self._shutdown_socket(response)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown(wait=False, cancel_futures=True)
 
     def fetch_site(
         self, url: str, title: Optional[str], category: Optional[str]
-    ) -> Dict[str, Union[ParsedFeedSite, List[ParsedFeedItem]]]:
+    ) -> Dict[str, Union[ParsedFeedSite, List[ParsedFeedItem], bool]]:
+        if not self.scheduler.is_due(url):
+            minutes = int(self.scheduler.seconds_until_due(url) / 60)
+            # treated as not modified, so the stored entries are kept (also while backing off from failures)
+            self.run_stats.record(url, title=title, outcome=OUTCOME_NOT_DUE)
+            if self.scheduler.is_failing(url):
+                Log.info("> Backing off: {title} (retry in {minutes} min)".format(title=title, minutes=minutes))
+            else:
+                Log.info("> Not due: {title} (in {minutes} min)".format(title=title, minutes=minutes))
+            return self._not_modified_site(title or self.http_cache.cached_title(url), category)
+
+        # not a failure of the feed, so no backoff for it
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            Log.warn("{title} ({url}) skipped, run deadline reached".format(title=title, url=url))
+            raise ValueError("run deadline reached")
+
+        started = time.monotonic()
         try:
-            feed_response = requests.get(
+            # the first access builds the session, importing `requests`, which belongs to the startup instead
+            session = self.session
+            with self.host_limiter.slot(url):
+                # waiting for a free slot isn't counted
+                request_started = time.monotonic()
+                self.run_stats.record_first_request()
+                feed_response = session.get(
+                    url, headers=self.http_cache.request_headers(url), timeout=self._timeout(), stream=True
+                )
+                download_started = time.monotonic()
+                feed_body = self._read_body(feed_response)
+                download_finished = time.monotonic()
+            self.run_stats.record(
                 url,
-                headers={
-                    "User-Agent": "pbrr/2.0 (https://github.com/Kartones/pbrr)",
-                },
-                timeout=15,
+                title=title or self.http_cache.cached_title(url),
+                status=feed_response.status_code,
+                request_time=download_started - request_started,
+                download_time=download_finished - download_started,
+                wire_bytes=feed_response.raw.tell(),
+                body_bytes=len(feed_body),
             )
-            feed_response.encoding = "utf-8"
-            source_site = feedparser.parse(feed_response.text)
         except Exception as e:
+            self.scheduler.record_failure(url)
+            self.run_stats.record(url, title=title, outcome=OUTCOME_FAILED, total_time=time.monotonic() - started)
             # else need to directly catch urllib errors
             if "Name or service not known" in str(e):
                 Log.warn_and_raise_error("{title} ({url}) skipped, error fetching url".format(title=title, url=url))
@@ -82,181 +154,153 @@ class Parser:
 
         # don't override, leave content as it is
         if feed_response.status_code == 304:
-            Log.warn("304 returned for: {title}".format(title=title))
-            return self._not_modified_site(title, category)
-
-        self._log_and_error_if_proceeds(
-            url=url, title=title, source_site=source_site, response_status_code=feed_response.status_code
-        )
-
-        parsed_site = self._parse_site(feed=source_site.feed, provided_title=title, category=category)
-
-        entries_count = len(source_site.entries)
-        parsed_entries = [
-            self._parse_entry(
-                entry=entry, parsed_site=parsed_site, entry_index=index, entry_reverse_index=(entries_count - index - 1)
+            Log.info("> Not modified: {title}".format(title=title))
+            self.http_cache.record(url, feed_response.status_code)
+            self.scheduler.record_success(url, None, feed_response.headers)
+            self.run_stats.record(url, outcome=OUTCOME_NOT_MODIFIED, total_time=time.monotonic() - started)
+            return self._not_modified_site(title or self.http_cache.cached_title(url), category)
+
+        # same as a 304, for servers that ignore the conditional request headers
+        body_hash = self._body_hash(feed_body)
+        if feed_response.status_code == 200 and body_hash == self.http_cache.cached_body_hash(url):
+            Log.info("> Unchanged: {title}".format(title=title))
+            self.http_cache.record(url, feed_response.status_code, feed_response.headers)
+            self.scheduler.record_success(url, None, feed_response.headers)
+            self.run_stats.record(url, outcome=OUTCOME_UNCHANGED, total_time=time.monotonic() - started)
+            return self._not_modified_site(title or self.http_cache.cached_title(url), category)
+
+        self.http_cache.record(url, feed_response.status_code)
+        try:
+            parsed_feed = self._parse_body(
+                url=url, title=title, category=category, status_code=feed_response.status_code, body=feed_body
             )
-            for index, entry in enumerate(source_site.entries)
-        ]
-
-        if parsed_entries:
-            parsed_entries = self._skip_entries(parsed_entries)
-            parsed_entries = self._filter_entries(parsed_entries)
+        except Exception as e:
+            # e.g. honor `Retry-After` of 429/503 responses
+            self.scheduler.record_failure(url, feed_response.headers)
+            self.run_stats.record(url, outcome=OUTCOME_FAILED, total_time=time.monotonic() - started)
+            if isinstance(e, ValueError):
+                raise
+            # e.g. a crashed parse worker process
+            Log.warn("{title} ({url}) skipped. Error: {error}".format(title=title, url=url, error=e))
+            raise ValueError(str(e))
+
+        parsed_site = parsed_feed.site
+        parsed_entries = parsed_feed.entries
+        self.run_stats.record(
+            url,
+            title=parsed_site.title,
+            outcome=OUTCOME_FETCHED,
+            parse_time=parsed_feed.parse_time,
+            sanitize_time=parsed_feed.sanitize_time,
+            entries_kept=len(parsed_entries),
+            entries_discarded=parsed_feed.entries_discarded,
+            total_time=time.monotonic() - started,
+        )
 
+        self.http_cache.record(url, feed_response.status_code, feed_response.headers, parsed_site.title, body_hash)
+        self.scheduler.record_success(url, parsed_entries, feed_response.headers)
         Log.info("> Fetched: {title}".format(title=title))
 
-        return {self.KEY_SITE: parsed_site, self.KEY_ENTRIES: parsed_entries}
-
-    def _skip_entries(self, entries: List[ParsedFeedItem]) -> List[ParsedFeedItem]:
-        return [
-            entry
-            for entry in entries
-            if not any([True for title in self.settings.skip_filters if title.upper() in entry.title.upper()])
-        ]
-
-    def _filter_entries(self, entries: List[ParsedFeedItem]) -> List[ParsedFeedItem]:
-        # reorder by most recent first (seen inverse order)
-        entries = sorted(entries, key=lambda s: (s.published), reverse=True)
-        # cut to a reasonable limit (seen also feeds with full dumps of content)
-        entries = entries[: self.settings.num_entries_per_feed]
-
-        if not self.settings.entry_max_age_months:
-            return entries
+        return {self.KEY_SITE: parsed_site, self.KEY_ENTRIES: parsed_entries, self.KEY_NOT_MODIFIED: False}
 
-        min_post_datetime = datetime.now() - timedelta(days=self.settings.entry_max_age_months * 30)
+    def _parse_body(
+        self, url: str, title: Optional[str], category: Optional[str], status_code: int, body: bytes
+    ) -> ParsedFeed:
+        if self.parse_executor is None:
+            return self.feed_parser.parse(url=url, title=title, category=category, status_code=status_code, body=body)
 
-        return [entry for entry in entries if entry.published >= min_post_datetime]
+        # this fetching thread just waits, while the parsing runs at another process (and core)
+        future = self.parse_executor.submit(
+            parse_in_worker, url=url, title=title, category=category, status_code=status_code, body=body
+        )
+        if self.deadline is None:
+            return future.result()
+        try:
+            return future.result(timeout=max(0, self.deadline - time.monotonic()))
+        except FutureTimeoutError:
+            Log.warn("{title} ({url}) skipped, run deadline reached while parsing".format(title=title, url=url))
+            raise ValueError("run deadline reached")
+
+    def _body_hash(self, body: bytes) -> str:
+        # parsing settings are part of the hash, so changing e.g. the filters reparses every feed
+        hashAlgoritm = hashlib.md5()
+        hashAlgoritm.update(self._parse_settings_key)
+        hashAlgoritm.update(body)
+        return hashAlgoritm.hexdigest()
+
+    def _build_session(self) -> "requests.Session":
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.request import ACCEPT_ENCODING
+
+        # a single session shared by all fetches, so connections to the same host get reused (keep-alive)
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.settings.http_pool_size, pool_maxsize=max(1, self.settings.max_connections_per_host)
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # brotli is only advertised if the library to decode it is installed
+        session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": ACCEPT_ENCODING})
+        return session
+
+    def _timeout(self) -> Tuple[float, float]:
+        read_timeout = self.settings.read_timeout_seconds
+        if self.deadline is not None:
+            read_timeout = max(0.1, min(read_timeout, self.deadline - time.monotonic()))
+        return (self.settings.connect_timeout_seconds, read_timeout)
+
+    def _read_body(self, response: "requests.Response") -> bytes:
+        max_bytes = self.settings.max_response_bytes
+        chunks = []
+        size = 0
+
+        with self._open_responses_lock:
+            self._open_responses.add(response)
+        try:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                raise ValueError("run deadline reached")
+
+            content_length = response.headers.get("Content-Length", "")
+            if max_bytes and content_length.isdigit() and int(content_length) > max_bytes:
+                raise ValueError("response too big ({size} bytes)".format(size=content_length))
+
+            # decompressed chunks, so the limit also protects against compression bombs
+            for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise ValueError("response bigger than {size} bytes".format(size=max_bytes))
+                if self.deadline is not None and time.monotonic() > self.deadline:
+                    raise ValueError("run deadline reached")
+                chunks.append(chunk)
+        finally:
+            with self._open_responses_lock:
+                self._open_responses.discard(response)
+            response.close()
+
+        return b"".join(chunks)
 
     @staticmethod
-    def _log_and_error_if_proceeds(url: str, title: Optional[str], source_site: Any, response_status_code: int) -> None:
-        # just warn, don't skip
-        if "bozo" in source_site.keys() and source_site["bozo"] == 1 and response_status_code != 200:
-            Log.info(
-                "{title} ({url}) bozo=1 http_status:{status}".format(title=title, url=url, status=response_status_code)
-            )
-
-        # should always skip by raising error
-        if (
-            not source_site.feed.keys()
-            or "link" not in source_site.feed.keys()
-            or response_status_code in [401, 403, 404]
-        ):
-            Log.warn_and_raise_error(
-                "{title} ({url}) skipped, feed malformed/not retrieved. HTTPStatus: {status}".format(
-                    title=title,
-                    url=url,
-                    status=response_status_code,
-                )
-            )
-
-        if response_status_code in [301]:
-            Log.warn(
-                "{title} ({url}) has moved ({status}) Check new URL".format(
-                    title=title, url=url, status=response_status_code
-                )
-            )
-
-        if response_status_code in [410]:
-            Log.warn_and_raise_error(
-                "{title} ({url}) skipped, received http_status:{status} Url gone".format(
-                    title=title, url=url, status=response_status_code
-                )
-            )
+    def _shutdown_socket(response: "requests.Response") -> None:
+        # the blocked read returns right away, unlike with a close from another thread
+        sock = getattr(response.raw.connection, "sock", None)
+        if sock is None:
+            # connections closing after the response hand their socket over to it (`http.client` internals)
+            try:
+                sock = response.raw._fp.fp.raw._sock
+            except AttributeError:
+                return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
     @classmethod
     def _not_modified_site(
         cls, title: Optional[str], category: Optional[str]
-    ) -> Dict[str, Union[ParsedFeedSite, List[ParsedFeedItem]]]:
-        return {cls.KEY_SITE: cls._parse_site(feed=None, provided_title=title, category=category), cls.KEY_ENTRIES: []}
-
-    @classmethod
-    def _parse_site(cls, feed: Optional[Any], provided_title: Optional[str], category: Optional[str]) -> ParsedFeedSite:
-        return ParsedFeedSite(
-            title=cls._sanitize_site_title(feed=feed, provided_title=provided_title),
-            category=category,
-            link=feed.link if feed else None,
-        )
-
-    @classmethod
-    def _parse_entry(
-        cls, entry: Any, parsed_site: ParsedFeedSite, entry_index: int, entry_reverse_index: int
-    ) -> ParsedFeedItem:
-        content = ""
-        content_key = None
-        is_array = False
-
-        # seen some entries on same site with and without summary_detail, so can't just sample and apply to all
-        if "content" in entry.keys():
-            content_key = "content"
-            is_array = True
-        elif "summary_detail" in entry.keys():
-            content_key = "summary_detail"
-        elif "title_detail" in entry.keys():
-            content_key = "title_detail"
-
-        if content_key:
-            if is_array:
-                content_by_type = [content.value for content in entry[content_key] if content.type == "text/html"]
-                if not content_by_type:
-                    content_by_type = [content.value for content in entry[content_key] if content.type == "text/plain"]
-                content = content_by_type[0] if content_by_type else ""
-            else:
-                content = entry[content_key].value
-
-        published = cls._published_field_from(
-            entry=entry, entry_index=entry_index, entry_reverse_index=entry_reverse_index
-        )
-
-        site_url = "https://{site}".format(
-            site=parsed_site.link.replace("https://", "").replace("http://", "").split("/")[0]
-        )
-
-        # Some blogs return relative urls as the entry link (and some report site base url as non-https)
-        entry_link = entry.link
-        if entry_link[:1] == "/":
-            entry_link = "{site}{entry}".format(site=site_url, entry=entry.link)
-
-        content = re.sub(r"<script>.*?<\/script>", "", content, count=0, flags=re.I | re.S)
-        content = re.sub(r"<img (.*?) />", r'<img loading="lazy" \1 />', content, count=0, flags=re.I | re.S)
-        # break content's CSS that would otherwise render wrongly
-        content = re.sub(r' class="button"', "", content, count=0, flags=re.I | re.S)
-        content = re.sub(r"<a (.*?)>", r'<a target="_blank" \1>', content, count=0, flags=re.I | re.S)
-
-        # fix relative urls inside posts (e.g. Github private RSS)
-        content = re.sub(
-            r" href=\"(/.*?)\"", r' href="{site}\1"'.format(site=site_url), content, count=0, flags=re.I | re.S
-        )
-
-        return ParsedFeedItem(
-            title=entry.title, link=entry_link, published=published, content=content, parent=parsed_site
-        )
-
-    @staticmethod
-    def _published_field_from(entry: Any, entry_index: int, entry_reverse_index: int) -> datetime:
-        published = None
-
-        if "published" in entry.keys():
-            published = entry.published_parsed if "published_parsed" in entry.keys() else entry.published
-        elif "updated" in entry.keys():
-            published = entry.updated_parsed if "updated_parsed" in entry.keys() else entry.updated
-
-        if not published:
-            # fake a post time to avoid collisions when generating files
-            published = time.gmtime(time.mktime(time.gmtime()) - (entry_index * ONE_MONTH_IN_SECONDS))
-            # change the time-tuple day to the 1st of the month (so they don't always appear as recent/new)
-            published = published[:2] + (1,) + published[3:]
-
-        published_datetime = datetime.fromtimestamp(time.mktime(published))
-        # use seconds as a way to differentiate each entry, so if two are published at the same time, don't collide
-        published_datetime = published_datetime + timedelta(seconds=entry_reverse_index)
-
-        return published_datetime
-
-    @staticmethod
-    def _sanitize_site_title(feed: Any, provided_title: Optional[str]) -> str:
-        if provided_title:
-            return provided_title
-        elif not feed or "title" not in feed.keys():
-            return "untitled{ts}".format(ts=time.time_ns())
-        else:
-            return feed.title.encode("utf-8", errors="ignore").decode()
+    ) -> Dict[str, Union[ParsedFeedSite, List[ParsedFeedItem], bool]]:
+        return {
+            cls.KEY_SITE: FeedParser.site_without_feed(title=title, category=category),
+            cls.KEY_ENTRIES: [],
+            cls.KEY_NOT_MODIFIED: True,
+        }
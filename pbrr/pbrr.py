@@ -1,36 +1,144 @@
-from typing import List, cast
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union, cast
 
+from pbrr.entry_store import EntryStore
+from pbrr.feed_scheduler import FeedScheduler
+from pbrr.http_cache import HttpCache
+from pbrr.log import Log
+from pbrr.opml_reader import OpmlReader, SiteMetadata
 from pbrr.parsed_feed_item import ParsedFeedItem
 from pbrr.parsed_feed_site import ParsedFeedSite
 from pbrr.parser import Parser
+from pbrr.run_stats import RunStats
 from pbrr.settings import Settings
 from pbrr.writer import Writer
 
+FetchResult = Dict[str, Union[ParsedFeedSite, List[ParsedFeedItem], bool]]
+SitesMetadata = List[SiteMetadata]
+
 
 class PBRR:
-    def __init__(self, data_path: str, opml_filename: str) -> None:
+    def __init__(self, data_path: str, opml_filenames: List[str], parse_workers: Optional[int] = None) -> None:
         self.data_path = data_path
-        self.opml_filename = opml_filename
+        # sites of all files are merged, in the same order
+        self.opml_filenames = opml_filenames
+        # overrides the setting, for this run only
+        self.parse_workers = parse_workers
 
     def run(self) -> None:
-        settings = Settings(base_output_path=self.data_path)
-        settings.load()
+        self.start()
+        self.refresh()
+        self.stop()
+
+    def start(self) -> None:
+        # everything kept between refreshes, so a long-running process (see `Daemon`) reuses connections & caches
+        self.settings = Settings(base_output_path=self.data_path)
+        self.settings.load()
+
+        self.http_cache = HttpCache(base_output_path=self.data_path)
+        self.http_cache.load()
+
+        self.scheduler = FeedScheduler(settings=self.settings)
+        self.scheduler.load()
+
+        self.entry_store = EntryStore(settings=self.settings)
+        self.entry_store.open()
+
+        self.parser = Parser(
+            settings=self.settings,
+            http_cache=self.http_cache,
+            scheduler=self.scheduler,
+            run_stats=RunStats(),
+            parse_workers=self.parse_workers if self.parse_workers is not None else self.settings.parse_workers,
+        )
+        self.opml_reader = OpmlReader(settings=self.settings)
+
+    def refresh(self) -> None:
+        settings = self.settings
+        http_cache = self.http_cache
+        scheduler = self.scheduler
+        parser = self.parser
 
-        parser = Parser(settings=settings)
-        writer = Writer(settings=settings)
+        run_stats = RunStats()
+        parser.run_stats = run_stats
+        scheduler.start_run()
+        writer = Writer(settings=settings, run_stats=run_stats, entry_store=self.entry_store)
 
-        sites_metadata = parser.fetch_sites_metadata(self.opml_filename)
+        sites_metadata = self.opml_reader.read(self.opml_filenames)
+        http_cache.prune(url for url, _, _ in sites_metadata)
+        scheduler.prune(url for url, _, _ in sites_metadata)
 
-        for url, title, category in sites_metadata:
-            try:
-                parsed_data = parser.fetch_site(url=url, title=title, category=category)
-            except ValueError:
-                continue
+        deadline = time.monotonic() + settings.run_deadline_seconds if settings.run_deadline_seconds else None
+        parser.deadline = deadline
 
+        for url, title, parsed_data in self._fetch_sites(parser, settings, sites_metadata, deadline):
             site = cast(ParsedFeedSite, parsed_data[Parser.KEY_SITE])
             entries = cast(List[ParsedFeedItem], parsed_data[Parser.KEY_ENTRIES])
 
-            writer.enqueue(site, entries)
+            if not parsed_data[Parser.KEY_NOT_MODIFIED]:
+                writer.enqueue(site, entries)
+            elif writer.has_site_data(site):
+                writer.enqueue_unchanged(site)
+            elif scheduler.is_failing(url):
+                # backing off a feed that never succeeded, forgetting it would retry it right away
+                pass
+            else:
+                # nothing to keep (e.g. output folder cleaned), next run will do a full fetch
+                Log.warn("{title} ({url}) skipped, not modified but no previous data".format(title=title, url=url))
+                http_cache.forget(url)
+                scheduler.forget(url)
 
+        self.entry_store.prune_stale_sites()
         writer.save_data()
         settings.save()
+        http_cache.save()
+        scheduler.save()
+        run_stats.save(self.data_path)
+        run_stats.log_summary()
+
+    def stop(self) -> None:
+        self.parser.close()
+        self.entry_store.close()
+
+    @classmethod
+    def _fetch_sites(
+        cls, parser: Parser, settings: Settings, sites_metadata: SitesMetadata, deadline: Optional[float]
+    ) -> Iterator[Tuple[str, Optional[str], FetchResult]]:
+        executor = ThreadPoolExecutor(max_workers=max(1, settings.fetch_workers))
+        # everything submitted right away, so a slow feed waiting to be consumed doesn't leave the other workers idle.
+        # Finished results are only a site and its (capped) entries until their turn comes
+        pending: Deque[Tuple[str, Optional[str], "Future[FetchResult]"]] = deque(
+            (url, title, executor.submit(parser.fetch_site, url=url, title=title, category=category))
+            for url, title, category in sites_metadata
+        )
+        deadline_reached = False
+
+        # consume results in OPML order, so output is deterministic no matter which feed finishes first
+        while pending:
+            url, title, future = pending.popleft()
+
+            if deadline_reached and not future.done():
+                Log.warn("{title} ({url}) skipped, run deadline reached".format(title=title, url=url))
+            else:
+                try:
+                    yield url, title, cls._result(future, deadline)
+                except FutureTimeoutError:
+                    deadline_reached = True
+                    Log.warn("{title} ({url}) skipped, run deadline reached".format(title=title, url=url))
+                except ValueError:
+                    pass
+
+        # don't wait for hung fetches, their results would be discarded anyway
+        executor.shutdown(wait=False, cancel_futures=True)
+        if deadline_reached:
+            # else their threads would keep the process alive until their downloads finish
+            parser.abort_requests()
+
+    @staticmethod
+    def _result(future: "Future[FetchResult]", deadline: Optional[float]) -> FetchResult:
+        if deadline is None:
+            return future.result()
+        return future.result(timeout=max(0, deadline - time.monotonic()))
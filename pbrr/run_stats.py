@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from pbrr.atomic_file import write_atomically
+from pbrr.log import Log
+
+RUN_STATS_FILENAME = "run-stats.json"
+SLOWEST_FEEDS_TO_LOG = 10
+
+# feed outcomes
+OUTCOME_FETCHED = "fetched"
+OUTCOME_NOT_MODIFIED = "not_modified"
+# a full response, but same body as the last one parsed
+OUTCOME_UNCHANGED = "unchanged"
+OUTCOME_NOT_DUE = "not_due"
+OUTCOME_FAILED = "failed"
+
+# per feed values. All times in seconds, sizes in bytes
+KEY_TITLE = "title"
+KEY_OUTCOME = "outcome"
+KEY_STATUS = "status"
+# until the response headers arrive: DNS resolution, connection, TLS handshake and server time
+KEY_REQUEST_TIME = "request_time"
+KEY_DOWNLOAD_TIME = "download_time"
+# transferred (possibly compressed) and decompressed body sizes
+KEY_WIRE_BYTES = "wire_bytes"
+KEY_BODY_BYTES = "body_bytes"
+# feedparser parse, then selection of entries to keep & sanitization of their content
+KEY_PARSE_TIME = "parse_time"
+KEY_SANITIZE_TIME = "sanitize_time"
+KEY_ENTRIES_KEPT = "entries_kept"
+KEY_ENTRIES_DISCARDED = "entries_discarded"
+# serialization & writing of the site data file
+KEY_SERIALIZE_TIME = "serialize_time"
+KEY_WRITE_TIME = "write_time"
+KEY_WRITTEN_BYTES = "written_bytes"
+KEY_TOTAL_TIME = "total_time"
+
+SUMMED_KEYS = [
+    KEY_REQUEST_TIME,
+    KEY_DOWNLOAD_TIME,
+    KEY_WIRE_BYTES,
+    KEY_BODY_BYTES,
+    KEY_PARSE_TIME,
+    KEY_SANITIZE_TIME,
+    KEY_ENTRIES_KEPT,
+    KEY_ENTRIES_DISCARDED,
+    KEY_SERIALIZE_TIME,
+    KEY_WRITE_TIME,
+    KEY_WRITTEN_BYTES,
+]
+
+
+class RunStats:
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.feeds: Dict[str, Dict[str, Any]] = {}
+        self._started_monotonic = time.monotonic()
+        # monotonic time when the first request got sent. `None` if no feed was due
+        self.first_request_at: Optional[float] = None
+        self._urls_by_title: Dict[str, str] = {}
+        self._lock = Lock()
+
+    def record(self, url: str, **values: Any) -> None:
+        with self._lock:
+            feed = self.feeds.setdefault(url, {})
+            feed.update(values)
+            if values.get(KEY_TITLE):
+                self._urls_by_title[values[KEY_TITLE]] = url
+
+    def record_first_request(self) -> None:
+        with self._lock:
+            if self.first_request_at is None:
+                self.first_request_at = time.monotonic()
+
+    def record_site_write(self, site_title: str, **values: Any) -> None:
+        # the writer only knows about sites, not about feed urls
+        with self._lock:
+            url = self._urls_by_title.get(site_title, site_title)
+            feed = self.feeds.setdefault(url, {KEY_TITLE: site_title})
+            feed.update(values)
+            feed[KEY_TOTAL_TIME] = (
+                feed.get(KEY_TOTAL_TIME, 0) + values.get(KEY_SERIALIZE_TIME, 0) + values.get(KEY_WRITE_TIME, 0)
+            )
+
+    def save(self, base_output_path: str) -> None:
+        data = {
+            "started_at": self.started_at,
+            "duration": time.monotonic() - self._started_monotonic,
+            "first_request_after": (
+                self.first_request_at - self._started_monotonic if self.first_request_at is not None else None
+            ),
+            "totals": self._totals(),
+            "feeds": [dict(url=url, **feed) for url, feed in self._slowest_feeds()],
+        }
+
+        # served along with the output, so never seen half-written
+        write_atomically(os.path.join(base_output_path, RUN_STATS_FILENAME), json.dumps(data, indent=2).encode("utf8"))
+
+    def log_summary(self) -> None:
+        totals = self._totals()
+        Log.info(
+            "> Run took {duration:.2f}s. Feeds: {outcomes}. Downloaded {wire_bytes} bytes".format(
+                duration=time.monotonic() - self._started_monotonic,
+                outcomes=", ".join(f"{count} {outcome}" for outcome, count in sorted(totals["outcomes"].items())),
+                wire_bytes=totals[KEY_WIRE_BYTES],
+            )
+        )
+
+        Log.info("> Slowest feeds:")
+        for url, feed in self._slowest_feeds()[:SLOWEST_FEEDS_TO_LOG]:
+            Log.info(
+                "  {total:7.2f}s  request {request:.2f}s  download {download:.2f}s  parse {parse:.2f}s  "
+                "sanitize {sanitize:.2f}s  write {write:.2f}s  {title} ({url})".format(
+                    total=feed.get(KEY_TOTAL_TIME, 0),
+                    request=feed.get(KEY_REQUEST_TIME, 0),
+                    download=feed.get(KEY_DOWNLOAD_TIME, 0),
+                    parse=feed.get(KEY_PARSE_TIME, 0),
+                    sanitize=feed.get(KEY_SANITIZE_TIME, 0),
+                    write=feed.get(KEY_SERIALIZE_TIME, 0) + feed.get(KEY_WRITE_TIME, 0),
+                    title=feed.get(KEY_TITLE),
+                    url=url,
+                )
+            )
+
+    def _slowest_feeds(self) -> List[Any]:
+        with self._lock:
+            return sorted(self.feeds.items(), key=lambda item: item[1].get(KEY_TOTAL_TIME, 0), reverse=True)
+
+    def _totals(self) -> Dict[str, Any]:
+        with self._lock:
+            totals: Dict[str, Any] = {key: sum(feed.get(key, 0) for feed in self.feeds.values()) for key in SUMMED_KEYS}
+            outcomes: Dict[str, int] = {}
+            for feed in self.feeds.values():
+                outcome = feed.get(KEY_OUTCOME)
+                if outcome:
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            totals["outcomes"] = outcomes
+        return totals
@@ -1,8 +1,10 @@
 import json
 import os
+import re
 from typing import Dict, List
 
 from pbrr.log import Log
+from pbrr.skip_matchers import SkipFiltersMatcher, SkipUrlsMatcher
 
 SETTINGS_FILENAME = "settings-v2.json"
 # domains to skip (e.g. can't fetch right now via pbrr). to be manually added editing the settings json
@@ -11,10 +13,47 @@ KEY_SKIP_URLS = "skip_urls"
 KEY_EMOJI_ICONS = "category_emoji_icons"
 # list of case-insensitive substrings that, if match at an entry's title, the entry will be skipped
 KEY_SKIP_FILTERS = "skip_filters"
+# list of case-insensitive regular expressions that, if match at an entry's title, the entry will be skipped
+KEY_SKIP_REGEX_FILTERS = "skip_regex_filters"
 # Number of (maximum) entries per feed to keep
 KEY_ENTRIES_PER_FEED = "num_entries_per_feed"
 # If an entry is older than this number of months, will get filtered out. `None` disables this feature
 KEY_ENTRY_MAX_AGE_MONTHS = "entry_max_age_months"
+# Number of feeds fetched & parsed in parallel. 1 fetches sequentially
+KEY_FETCH_WORKERS = "fetch_workers"
+# Number of processes parsing the fetched feeds, in parallel to the fetching. 0 parses at the fetching threads
+KEY_PARSE_WORKERS = "parse_workers"
+# Maximum number of simultaneous requests against the same host
+KEY_MAX_CONNECTIONS_PER_HOST = "max_connections_per_host"
+# Max duration of a whole run, in seconds. Feeds not fetched by then are skipped. `None` disables this feature
+KEY_RUN_DEADLINE_SECONDS = "run_deadline_seconds"
+# Number of hosts whose connections are kept alive for reuse
+KEY_HTTP_POOL_SIZE = "http_pool_size"
+# Seconds to wait to establish a connection, and between bytes received once connected
+KEY_CONNECT_TIMEOUT_SECONDS = "connect_timeout_seconds"
+KEY_READ_TIMEOUT_SECONDS = "read_timeout_seconds"
+# Feeds bigger than this (uncompressed) get skipped. `None` disables this feature
+KEY_MAX_RESPONSE_BYTES = "max_response_bytes"
+# If true, each site is written as soon as fetched instead of all at the end of the run
+KEY_STREAM_OUTPUT = "stream_output"
+# If true, each feed is only fetched when due, based on how often it publishes and on its failures
+KEY_ADAPTIVE_REFRESH = "adaptive_refresh"
+# Bounds of the time between fetches of a feed when `adaptive_refresh` is enabled
+KEY_MIN_REFRESH_MINUTES = "min_refresh_minutes"
+KEY_MAX_REFRESH_HOURS = "max_refresh_hours"
+# Number of entries of each page of the reader's entries index, most recent ones at the first page
+KEY_ENTRIES_PER_PAGE = "entries_per_page"
+# Either `indented` (human readable) or `minified` JSON data files
+KEY_OUTPUT_FORMAT = "output_format"
+# If true, `.gz` and `.br` compressed copies are written next to each data file (e.g. for nginx's `gzip_static`)
+KEY_PRECOMPRESS_OUTPUT = "precompress_output"
+# Minutes between refreshes when running as a daemon (`--daemon`)
+KEY_DAEMON_REFRESH_MINUTES = "daemon_refresh_minutes"
+# Local port where a daemon listens for `POST /refresh` requests to refresh right away. `None` disables this feature
+KEY_DAEMON_TRIGGER_PORT = "daemon_trigger_port"
+
+OUTPUT_FORMAT_INDENTED = "indented"
+OUTPUT_FORMAT_MINIFIED = "minified"
 
 
 class Settings:
@@ -23,8 +62,27 @@ class Settings:
         self.skip_urls: List[str] = []
         self.category_icons: Dict[str, str] = {}
         self.skip_filters: List[str] = []
+        self.skip_regex_filters: List[str] = []
         self.num_entries_per_feed = 10
         self.entry_max_age_months = None
+        self.fetch_workers = 8
+        self.parse_workers = 0
+        self.max_connections_per_host = 2
+        self.run_deadline_seconds = None
+        self.http_pool_size = 50
+        self.connect_timeout_seconds = 5
+        self.read_timeout_seconds = 15
+        self.max_response_bytes = 10 * 1024 * 1024
+        self.stream_output = False
+        self.adaptive_refresh = False
+        self.min_refresh_minutes = 30
+        self.max_refresh_hours = 24
+        self.entries_per_page = 200
+        self.output_format = OUTPUT_FORMAT_INDENTED
+        self.precompress_output = False
+        self.daemon_refresh_minutes = 30
+        self.daemon_trigger_port = None
+        self._build_matchers()
 
     def load(self) -> None:
         file_path = os.path.join(self.base_output_path, SETTINGS_FILENAME)
@@ -36,8 +94,31 @@ class Settings:
             Log.info(f"> Skip urls list: {self.skip_urls}")
             self.category_icons = data.get(KEY_EMOJI_ICONS, {})
             self.skip_filters = data.get(KEY_SKIP_FILTERS, [])
+            self.skip_regex_filters = data.get(KEY_SKIP_REGEX_FILTERS, [])
             self.num_entries_per_feed = data.get(KEY_ENTRIES_PER_FEED, 10)
             self.entry_max_age_months = data.get(KEY_ENTRY_MAX_AGE_MONTHS, None)
+            self.fetch_workers = data.get(KEY_FETCH_WORKERS, 8)
+            self.parse_workers = data.get(KEY_PARSE_WORKERS, 0)
+            self.max_connections_per_host = data.get(KEY_MAX_CONNECTIONS_PER_HOST, 2)
+            self.run_deadline_seconds = data.get(KEY_RUN_DEADLINE_SECONDS, None)
+            self.http_pool_size = data.get(KEY_HTTP_POOL_SIZE, 50)
+            self.connect_timeout_seconds = data.get(KEY_CONNECT_TIMEOUT_SECONDS, 5)
+            self.read_timeout_seconds = data.get(KEY_READ_TIMEOUT_SECONDS, 15)
+            self.max_response_bytes = data.get(KEY_MAX_RESPONSE_BYTES, 10 * 1024 * 1024)
+            self.stream_output = data.get(KEY_STREAM_OUTPUT, False)
+            self.adaptive_refresh = data.get(KEY_ADAPTIVE_REFRESH, False)
+            self.min_refresh_minutes = data.get(KEY_MIN_REFRESH_MINUTES, 30)
+            self.max_refresh_hours = data.get(KEY_MAX_REFRESH_HOURS, 24)
+            self.entries_per_page = data.get(KEY_ENTRIES_PER_PAGE, 200)
+            self.output_format = data.get(KEY_OUTPUT_FORMAT, OUTPUT_FORMAT_INDENTED)
+            self.precompress_output = data.get(KEY_PRECOMPRESS_OUTPUT, False)
+            self.daemon_refresh_minutes = data.get(KEY_DAEMON_REFRESH_MINUTES, 30)
+            self.daemon_trigger_port = data.get(KEY_DAEMON_TRIGGER_PORT, None)
+
+        if self.output_format not in [OUTPUT_FORMAT_INDENTED, OUTPUT_FORMAT_MINIFIED]:
+            Log.error_and_exit(f"Invalid '{KEY_OUTPUT_FORMAT}' setting: {self.output_format}")
+
+        self._build_matchers()
 
     def save(self) -> None:
         file_path = os.path.join(self.base_output_path, SETTINGS_FILENAME)
@@ -49,9 +130,35 @@ class Settings:
             KEY_SKIP_URLS: self.skip_urls,
             KEY_EMOJI_ICONS: self.category_icons,
             KEY_SKIP_FILTERS: self.skip_filters,
+            KEY_SKIP_REGEX_FILTERS: self.skip_regex_filters,
             KEY_ENTRIES_PER_FEED: self.num_entries_per_feed,
             KEY_ENTRY_MAX_AGE_MONTHS: self.entry_max_age_months,
+            KEY_FETCH_WORKERS: self.fetch_workers,
+            KEY_PARSE_WORKERS: self.parse_workers,
+            KEY_MAX_CONNECTIONS_PER_HOST: self.max_connections_per_host,
+            KEY_RUN_DEADLINE_SECONDS: self.run_deadline_seconds,
+            KEY_HTTP_POOL_SIZE: self.http_pool_size,
+            KEY_CONNECT_TIMEOUT_SECONDS: self.connect_timeout_seconds,
+            KEY_READ_TIMEOUT_SECONDS: self.read_timeout_seconds,
+            KEY_MAX_RESPONSE_BYTES: self.max_response_bytes,
+            KEY_STREAM_OUTPUT: self.stream_output,
+            KEY_ADAPTIVE_REFRESH: self.adaptive_refresh,
+            KEY_MIN_REFRESH_MINUTES: self.min_refresh_minutes,
+            KEY_MAX_REFRESH_HOURS: self.max_refresh_hours,
+            KEY_ENTRIES_PER_PAGE: self.entries_per_page,
+            KEY_OUTPUT_FORMAT: self.output_format,
+            KEY_PRECOMPRESS_OUTPUT: self.precompress_output,
+            KEY_DAEMON_REFRESH_MINUTES: self.daemon_refresh_minutes,
+            KEY_DAEMON_TRIGGER_PORT: self.daemon_trigger_port,
         }
 
         with open(file_path, "w", encoding="utf8") as file_handle:
             json.dump(data, file_handle, indent=None)
+
+    def _build_matchers(self) -> None:
+        # built once and reused for all feeds, as there can be hundreds of filters
+        self.skip_urls_matcher = SkipUrlsMatcher(self.skip_urls)
+        try:
+            self.skip_filters_matcher = SkipFiltersMatcher(self.skip_filters, self.skip_regex_filters)
+        except re.error as e:
+            Log.error_and_exit(f"Invalid '{KEY_SKIP_REGEX_FILTERS}' setting: {e}")
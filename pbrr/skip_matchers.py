@@ -0,0 +1,56 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Pattern
+
+
+class SkipFiltersMatcher:
+    # matches entry titles containing any of the (case-insensitive) filters, or any of the regular expressions
+    def __init__(self, filters: Iterable[str], regex_filters: Iterable[str]) -> None:
+        alternatives = [_alternation_pattern(filter.lower() for filter in filters)] + [
+            "(?:{regex})".format(regex=regex) for regex in regex_filters
+        ]
+        self._pattern = _compile_alternatives(alternatives, flags=re.I)
+
+    def matches(self, title: str) -> bool:
+        return bool(self._pattern and self._pattern.search(title))
+
+
+class SkipUrlsMatcher:
+    # matches urls starting with any of the (case-sensitive) prefixes
+    def __init__(self, prefixes: Iterable[str]) -> None:
+        self._pattern = _compile_alternatives([_alternation_pattern(prefixes)])
+
+    def matches(self, url: str) -> bool:
+        return bool(self._pattern and self._pattern.match(url))
+
+
+def _compile_alternatives(alternatives: List[str], flags: int = 0) -> Optional[Pattern]:
+    alternatives = [alternative for alternative in alternatives if alternative]
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives), flags=flags)
+
+
+def _alternation_pattern(words: Iterable[str]) -> str:
+    # a regex alternation factored as a trie (e.g. "skip", "sponsored" -> "s(?:kip|ponsored)"), so the regex engine
+    # checks each character once per position instead of trying every word
+    trie: Dict[str, Any] = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    return _trie_node_pattern(trie) if trie else ""
+
+
+def _trie_node_pattern(node: Dict[str, Any]) -> str:
+    # a word ending here already matches, so any longer word sharing this prefix is redundant
+    if "" in node:
+        return ""
+
+    branches = [re.escape(char) + _trie_node_pattern(child) for char, child in sorted(node.items())]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:{branches})".format(branches="|".join(branches))
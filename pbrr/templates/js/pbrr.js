@@ -1,15 +1,47 @@
-function initAccordion(element) {
-  document.addEventListener("click", function (e) {
-    if (!e.target.matches(element + " .post-button")) {
-      return;
-    } else {
-      e.target.parentElement.classList.toggle("active");
-    }
-  });
-}
+// sites & categories of the entries index, shared by all of its pages
+let entriesIndexTables = null;
 
 function read(setStateFunction) {
   const timestampMark = Date.now();
+
+  // first page of all entries already sorted, with the paths of the rest of pages. Older outputs only have the per-site files
+  fetch(`entries-index.json?t=${timestampMark}`)
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP status ${response.status}`);
+      }
+      return response.json();
+    })
+    .then((entriesIndex) => {
+      entriesIndexTables = {
+        sites: entriesIndex.sites,
+        categories: entriesIndex.categories,
+      };
+      _onDataReady(
+        _parseEntriesPage(entriesIndex),
+        entriesIndex.pages || [],
+        setStateFunction
+      );
+    })
+    .catch((error) => {
+      console.warn("Error fetching entries-index.json, reading sites", error);
+      _readSites(timestampMark, setStateFunction);
+    });
+
+  fetch(`last-updated.json?t=${timestampMark}`)
+    .then((response) => response.json())
+    .then((lastUpdated) => {
+      const lastUpdatedElement = document.getElementById("last-updated");
+      if (lastUpdatedElement) {
+        lastUpdatedElement.innerHTML = _formattedDate(lastUpdated.timestamp);
+      }
+    })
+    .catch((error) => {
+      console.error("Error fetching last-updated.json", error);
+    });
+}
+
+function _readSites(timestampMark, setStateFunction) {
   let allFeeds = [];
 
   fetch(`sites.json?t=${timestampMark}`)
@@ -25,24 +57,68 @@ function read(setStateFunction) {
       Promise.all(responses.map((response) => response.json()))
     )
     .then((sites) => sites.map((site) => _parseSite(site, allFeeds)))
-    .then(() => _onDataReady(allFeeds, setStateFunction));
+    .then(() => {
+      allFeeds.sort((first, second) => (second.date > first.date ? 1 : -1));
+      _onDataReady(allFeeds, [], setStateFunction);
+    });
+}
 
-  fetch(`last-updated.json?t=${timestampMark}`)
-    .then((response) => response.json())
-    .then((lastUpdated) => {
-      const lastUpdatedElement = document.getElementById("last-updated");
-      if (lastUpdatedElement) {
-        lastUpdatedElement.innerHTML = _formattedDate(lastUpdated.timestamp);
+function readPage(pagePath, setStateFunction, onErrorFunction) {
+  fetch(`${pagePath}?t=${Date.now()}`)
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP status ${response.status}`);
       }
+      return response.json();
     })
+    .then((page) => _onDataReady(_parseEntriesPage(page), [], setStateFunction))
     .catch((error) => {
-      console.error("Error fetching last-updated.json", error);
+      console.error(`Error fetching ${pagePath}`, error);
+      if (onErrorFunction) {
+        onErrorFunction(error);
+      }
     });
 }
 
+function readPostContent(post, setContentFunction) {
+  fetch(post.body)
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP status ${response.status}`);
+      }
+      return response.text();
+    })
+    .then((content) => setContentFunction(content))
+    .catch((error) => {
+      console.error(`Error fetching ${post.body}`, error);
+    });
+}
+
+function _parseEntriesPage(page) {
+  return page.entries.map((entry) => {
+    const site = entriesIndexTables.sites[entry.site];
+    const category = entriesIndexTables.categories[site.category];
+
+    return {
+      // the post file path is already unique
+      id: entry.body,
+      title: entry.title,
+      date: entry.date,
+      formattedDate: _formattedDate(entry.date),
+      url: entry.url,
+      // only the path, content is fetched when the post gets expanded
+      body: entry.body,
+      site: site.title,
+      site_category: category.title,
+      site_category_icon: category.category_icon,
+    };
+  });
+}
+
 function _parseSite(jsonData, allFeeds) {
   Object.entries(jsonData.entries)
     .map(([_, entry]) => ({
+      id: `${entry.url}|${entry.date}`,
       title: entry.title,
       date: entry.date,
       formattedDate: _formattedDate(entry.date),
@@ -55,11 +131,9 @@ function _parseSite(jsonData, allFeeds) {
     .forEach((entry) => allFeeds.push(entry));
 }
 
-function _onDataReady(allFeeds, setStateFunction) {
-  allFeeds.sort((first, second) => (second.date > first.date ? 1 : -1));
-
+function _onDataReady(allFeeds, pages, setStateFunction) {
   if (setStateFunction) {
-    setStateFunction(allFeeds);
+    setStateFunction(allFeeds, pages);
   } else {
     console.error("Missing setStateFunction() after reading feeds");
   }
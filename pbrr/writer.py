@@ -1,13 +1,19 @@
+import gzip
+import hashlib
 import json
 import os
 import shutil
+import time
 from datetime import datetime
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from pbrr.atomic_file import temp_path_for, write_atomically
+from pbrr.entry_store import EntryStore
 from pbrr.log import Log
 from pbrr.parsed_feed_item import ParsedFeedItem
 from pbrr.parsed_feed_site import ParsedFeedSite
-from pbrr.settings import Settings
+from pbrr.run_stats import RunStats
+from pbrr.settings import OUTPUT_FORMAT_MINIFIED, Settings
 
 BASE_FOLDER = "pbrr"
 TEMPLATES_FOLDER = "templates"
@@ -16,6 +22,21 @@ NO_CATEGORY_TITLE = "Uncategorized"
 
 SITES_LIST_FILE = "sites.json"
 LAST_UPDATED_FILE = "last-updated.json"
+# entries of all sites, most recent first. Only the first page is here, with the paths of the rest of pages
+ENTRIES_INDEX_FILE = "entries-index.json"
+PAGES_FOLDER = "pages"
+# content of each entry, loaded by the reader only when the entry gets expanded
+POSTS_FOLDER = "posts"
+# hash of each written data file, to skip rewriting those whose content didn't change
+OUTPUT_HASHES_FILE = "output-hashes.json"
+# how often a `stream_output` run updates the files read by the reader, so it shows the sites fetched so far
+STREAM_FLUSH_INTERVAL_SECONDS = 30
+
+# precompressed copies of the data files, written next to them when `precompress_output` is enabled
+GZIP_EXTENSION = ".gz"
+BROTLI_EXTENSION = ".br"
+# the maximum (11) is ~30x slower than this, for only ~7% smaller files
+BROTLI_QUALITY = 6
 
 KEY_SITES = "sites"
 KEY_DATETIME = "date"
@@ -25,71 +46,209 @@ KEY_URL = "url"
 KEY_CONTENT = "content"
 KEY_CATEGORY = "category"
 KEY_CATEGORY_ICON = "category_icon"
+KEY_CATEGORIES = "categories"
+KEY_SITE = "site"
+KEY_PAGES = "pages"
+KEY_BODY = "body"
 
 MAIN_TEMPLATE = "index"
 
 
 class Writer:
-    def __init__(self, settings: Settings) -> None:
+    def __init__(self, settings: Settings, run_stats: RunStats, entry_store: EntryStore) -> None:
         self.settings = settings
-        self.enqueued_data: List[Tuple[ParsedFeedSite, List[ParsedFeedItem]]] = []
+        self.run_stats = run_stats
+        # entries are merged into the store as they arrive, so only sites are kept, and whether their data file
+        # has to be (re)written
+        self.entry_store = entry_store
+        self.enqueued_data: List[Tuple[ParsedFeedSite, bool]] = []
+        self.output_hashes: Dict[str, str] = {}
+        self._output_prepared = False
+        self._last_flush = time.monotonic()
 
     def enqueue(self, site: ParsedFeedSite, entries: List[ParsedFeedItem]) -> None:
-        self.enqueued_data.append((site, entries))
+        changed = self.entry_store.merge(site, entries)
+        self._enqueue_site(site, changed or not os.path.exists(self._site_data_path(site)))
 
-    def save_data(self) -> None:
-        self._ensure_base_path()
+    def enqueue_unchanged(self, site: ParsedFeedSite) -> None:
+        # still merged, to keep the site alive at the store and to drop entries that got too old
+        self.enqueue(site, [])
 
-        self._copy_template_required_files()
+    def has_site_data(self, site: ParsedFeedSite) -> bool:
+        return self.entry_store.has_entries(site)
 
-        sites_list = []
+    def save_data(self) -> None:
+        self._prepare_output()
 
-        for (
-            site,
-            entries,
-        ) in self.enqueued_data:
-            sites_list.append(f"{site.title_for_filename}.json")
-            self._save_site_data(site, entries)
+        for site, needs_write in self.enqueued_data:
+            if needs_write:
+                self._save_site_data(site)
 
-        self._save_sites_list(sites_list)
+        self._save_reader_data([site for site, _ in self.enqueued_data])
 
         self._save_last_updated()
 
+        self._save_output_hashes()
+
+    def _enqueue_site(self, site: ParsedFeedSite, needs_write: bool) -> None:
+        if needs_write and self.settings.stream_output:
+            # write right away instead of all at the end of the run
+            self._prepare_output()
+            self._save_site_data(site)
+            needs_write = False
+
+        self.enqueued_data.append((site, needs_write))
+
+        if self.settings.stream_output and time.monotonic() - self._last_flush >= STREAM_FLUSH_INTERVAL_SECONDS:
+            self._flush_reader_data()
+
+    def _flush_reader_data(self) -> None:
+        # sites not fetched yet keep their stored entries, else they would vanish from the reader until the run ends
+        self._prepare_output()
+        enqueued_sites = [site for site, _ in self.enqueued_data]
+        enqueued_ids = {site.id for site in enqueued_sites}
+        self._save_reader_data(
+            enqueued_sites + [site for site in self.entry_store.sites() if site.id not in enqueued_ids]
+        )
+        self._save_output_hashes()
+        self._last_flush = time.monotonic()
+
+    def _save_reader_data(self, sites: List[ParsedFeedSite]) -> None:
+        self._save_sites_list([f"{site.title_for_filename}.json" for site in sites])
+        self._save_entries_index(sites)
+
+    def _prepare_output(self) -> None:
+        if self._output_prepared:
+            return
+
+        self._ensure_base_path()
+        self._load_output_hashes()
+
+        self._copy_template_required_files()
+
+        self._output_prepared = True
+
     def _save_last_updated(self) -> None:
         data = {
             "timestamp": datetime.now().timestamp(),
         }
 
-        with open(os.path.join(self.settings.base_output_path, LAST_UPDATED_FILE), "w", encoding="utf8") as file_handle:
-            json.dump(data, file_handle, indent=2)
+        self._write_json_if_changed(os.path.join(self.settings.base_output_path, LAST_UPDATED_FILE), data)
 
     def _save_sites_list(self, sites_list: List[str]) -> None:
         data = {
             KEY_SITES: sites_list,
         }
 
-        with open(os.path.join(self.settings.base_output_path, SITES_LIST_FILE), "w", encoding="utf8") as file_handle:
-            json.dump(data, file_handle, indent=2)
+        self._write_json_if_changed(os.path.join(self.settings.base_output_path, SITES_LIST_FILE), data)
+
+    def _save_entries_index(self, index_sites: List[ParsedFeedSite]) -> None:
+        categories: List[Dict[str, Any]] = []
+        category_indexes: Dict[Optional[str], int] = {}
+        sites = []
+        site_indexes: Dict[str, int] = {}
+        entries = []
+        posts_path = os.path.join(self.settings.base_output_path, POSTS_FOLDER)
+        os.makedirs(posts_path, exist_ok=True)
+
+        for site in index_sites:
+            if site.category not in category_indexes:
+                category_indexes[site.category] = len(categories)
+                categories.append(
+                    {KEY_TITLE: site.category, KEY_CATEGORY_ICON: self.settings.category_icons.get(site.category, None)}
+                )
+
+            site_indexes[site.id] = len(sites)
+            sites.append({KEY_TITLE: site.title, KEY_CATEGORY: category_indexes[site.category]})
+
+        # already sorted by the store. Sites not part of the index (e.g. failed to fetch) are left out
+        for entry in self.entry_store.entries_by_date():
+            if entry.site_id not in site_indexes:
+                continue
+
+            # bodies go to their own files, so pages only carry what the list of posts shows
+            post_filename = ParsedFeedItem.html_filename_for(entry.published, entry.id)
+            self._write_if_changed(os.path.join(posts_path, post_filename), entry.content.encode("utf8"))
+            entries.append(
+                {
+                    KEY_TITLE: entry.title,
+                    KEY_DATETIME: entry.published,
+                    KEY_URL: entry.link,
+                    KEY_BODY: f"{POSTS_FOLDER}/{post_filename}",
+                    KEY_SITE: site_indexes[entry.site_id],
+                }
+            )
+
+        entries_per_page = max(1, self.settings.entries_per_page)
+        pages = [entries[index : index + entries_per_page] for index in range(0, len(entries), entries_per_page)]
+        pages_path = os.path.join(self.settings.base_output_path, PAGES_FOLDER)
+        os.makedirs(pages_path, exist_ok=True)
+
+        # the first page also has the lookup tables of all pages, so the reader can render it with a single request
+        data = {
+            KEY_CATEGORIES: categories,
+            KEY_SITES: sites,
+            KEY_PAGES: [f"{PAGES_FOLDER}/{self._page_filename(number)}" for number in range(1, len(pages))],
+            KEY_ENTRIES: pages[0] if pages else [],
+        }
+        self._write_json_if_changed(os.path.join(self.settings.base_output_path, ENTRIES_INDEX_FILE), data)
+
+        for number in range(1, len(pages)):
+            self._write_json_if_changed(
+                os.path.join(pages_path, self._page_filename(number)), {KEY_ENTRIES: pages[number]}
+            )
 
-    def _save_site_data(self, site: ParsedFeedSite, entries: List[ParsedFeedItem]) -> None:
+        self._remove_stale_files(pages_path, {self._page_filename(number) for number in range(1, len(pages))})
+        self._remove_stale_files(posts_path, {os.path.basename(entry[KEY_BODY]) for entry in entries})
+
+    @staticmethod
+    def _page_filename(number: int) -> str:
+        return f"page-{number}.json"
+
+    def _remove_stale_files(self, folder_path: str, filenames_to_keep: Set[str]) -> None:
+        # e.g. pages no longer needed, or posts of entries that were dropped from their feed
+        for filename in os.listdir(folder_path):
+            original_filename, extension = os.path.splitext(filename)
+            if extension not in [GZIP_EXTENSION, BROTLI_EXTENSION]:
+                original_filename = filename
+            if original_filename in filenames_to_keep or filename.startswith("."):
+                continue
+            file_path = os.path.join(folder_path, filename)
+            os.remove(file_path)
+            self.output_hashes.pop(os.path.relpath(file_path, self.settings.base_output_path), None)
+
+    def _save_site_data(self, site: ParsedFeedSite) -> None:
+        entries = self.entry_store.site_entries(site)
+        serialize_started = time.monotonic()
         site_filepath = self._site_data_path(site)
         data = {
             KEY_TITLE: site.title,
             KEY_CATEGORY: site.category,
             KEY_CATEGORY_ICON: self.settings.category_icons.get(site.category, None),
             KEY_ENTRIES: {
-                str(entry.published.timestamp()): {
+                str(entry.published): {
                     KEY_TITLE: entry.title,
-                    KEY_DATETIME: entry.published.timestamp(),
+                    KEY_DATETIME: entry.published,
                     KEY_URL: entry.link,
                     KEY_CONTENT: entry.content,
                 }
                 for entry in entries
             },
         }
-        with open(site_filepath, "w", encoding="utf8") as file_handle:
-            json.dump(data, file_handle, indent=2)
-        Log.info(f"> Written: {site.title} ({len(entries)} entries)")
+        contents = self._serialize(data)
+        write_started = time.monotonic()
+        written = self._write_if_changed(site_filepath, contents)
+        self.run_stats.record_site_write(
+            site.title,
+            serialize_time=write_started - serialize_started,
+            write_time=time.monotonic() - write_started,
+            written_bytes=len(contents) if written else 0,
+        )
+
+        if written:
+            Log.info(f"> Written: {site.title} ({len(entries)} entries)")
+        else:
+            Log.info(f"> Unchanged: {site.title}")
 
     def _ensure_base_path(self) -> None:
         if not os.path.exists(self.settings.base_output_path):
@@ -100,9 +259,88 @@ class Writer:
 
     def _copy_template_required_files(self) -> None:
         for folder in ["css", "js", "fonts"]:
-            path = os.path.join(self.settings.base_output_path, folder)
-            shutil.copytree(os.path.join(BASE_FOLDER, TEMPLATES_FOLDER, folder), path, dirs_exist_ok=True)
+            source_folder = os.path.join(BASE_FOLDER, TEMPLATES_FOLDER, folder)
+            for filename in os.listdir(source_folder):
+                self._copy_if_changed(
+                    os.path.join(source_folder, filename),
+                    os.path.join(self.settings.base_output_path, folder, filename),
+                )
         for file in ["index.html"]:
-            shutil.copy2(
+            self._copy_if_changed(
                 os.path.join(BASE_FOLDER, TEMPLATES_FOLDER, file), os.path.join(self.settings.base_output_path, file)
             )
+
+    @classmethod
+    def _copy_if_changed(cls, source_path: str, destination_path: str) -> None:
+        # `copy2` keeps the modification time, so same size & mtime means the file was already copied
+        if os.path.exists(destination_path):
+            source_stat = os.stat(source_path)
+            destination_stat = os.stat(destination_path)
+            if source_stat.st_size == destination_stat.st_size and int(source_stat.st_mtime) == int(
+                destination_stat.st_mtime
+            ):
+                return
+
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        temp_path = temp_path_for(destination_path)
+        shutil.copy2(source_path, temp_path)
+        os.replace(temp_path, destination_path)
+
+    def _write_json_if_changed(self, file_path: str, data: Any) -> bool:
+        return self._write_if_changed(file_path, self._serialize(data))
+
+    def _serialize(self, data: Any) -> bytes:
+        if self.settings.output_format == OUTPUT_FORMAT_MINIFIED:
+            return json.dumps(data, separators=(",", ":")).encode("utf8")
+        return json.dumps(data, indent=2).encode("utf8")
+
+    def _write_if_changed(self, file_path: str, contents: bytes) -> bool:
+        content_hash = hashlib.md5(contents).hexdigest()
+        filename = os.path.relpath(file_path, self.settings.base_output_path)
+
+        if self.output_hashes.get(filename) == content_hash and self._is_written(file_path):
+            return False
+
+        write_atomically(file_path, contents)
+        self._write_compressed_copies(file_path, contents)
+        self.output_hashes[filename] = content_hash
+        return True
+
+    def _is_written(self, file_path: str) -> bool:
+        if not os.path.exists(file_path):
+            return False
+        if self.settings.precompress_output:
+            return os.path.exists(file_path + GZIP_EXTENSION) and os.path.exists(file_path + BROTLI_EXTENSION)
+        return True
+
+    def _write_compressed_copies(self, file_path: str, contents: bytes) -> None:
+        if self.settings.precompress_output:
+            # no timestamp at the gzip header, so same contents always produce the same file
+            import brotli
+
+            write_atomically(file_path + GZIP_EXTENSION, gzip.compress(contents, mtime=0))
+            write_atomically(file_path + BROTLI_EXTENSION, brotli.compress(contents, quality=BROTLI_QUALITY))
+            return
+
+        # an outdated copy would be served instead of the new contents
+        for extension in [GZIP_EXTENSION, BROTLI_EXTENSION]:
+            if os.path.exists(file_path + extension):
+                os.remove(file_path + extension)
+
+    def _load_output_hashes(self) -> None:
+        file_path = os.path.join(self.settings.base_output_path, OUTPUT_HASHES_FILE)
+        if not os.path.exists(file_path):
+            return
+
+        try:
+            with open(file_path, "r", encoding="utf8") as file_handle:
+                self.output_hashes = json.load(file_handle)
+        except ValueError:
+            # will simply rewrite all files
+            self.output_hashes = {}
+
+    def _save_output_hashes(self) -> None:
+        write_atomically(
+            os.path.join(self.settings.base_output_path, OUTPUT_HASHES_FILE),
+            json.dumps(self.output_hashes, indent=None).encode("utf8"),
+        )
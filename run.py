@@ -1,16 +1,68 @@
-import sys
+import argparse
+import time
 
-import colorama
+if __name__ == "__main__":
+    started_at = time.monotonic()
 
-from pbrr.pbrr import PBRR
+    argument_parser = argparse.ArgumentParser(
+        description="Fetches the feeds of one or more OPML files", epilog="e.g.: python3 run.py feeds subscriptions.xml"
+    )
+    argument_parser.add_argument("data_path", help="data path folder, where the OPML file is and output is written")
+    argument_parser.add_argument(
+        "opml_filenames", nargs="+", help="OPML filenames, relative to the data path folder. Their feeds get merged"
+    )
+    argument_parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="number of processes parsing the fetched feeds (0 parses at the fetching threads). "
+        "Overrides the 'parse_workers' setting",
+    )
+    argument_parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running, refreshing every 'daemon_refresh_minutes' (and on 'POST /refresh' at 'daemon_trigger_port')",
+    )
+    argument_parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report the time spent importing modules and until the first request is sent",
+    )
+    arguments = argument_parser.parse_args()
+    if arguments.daemon and arguments.profile_startup:
+        argument_parser.error("--profile-startup only applies to single runs")
+
+    # after parsing the arguments, so `--help` and usage errors don't wait for them
+    imports_started_at = time.monotonic()
+    import colorama
+
+    from pbrr.log import Log
+    from pbrr.pbrr import PBRR
+
+    imports_time = time.monotonic() - imports_started_at
 
-if __name__ == "__main__":
     colorama.init()
 
-    if len(sys.argv) < 3:
-        print("Please specify data path folder and opml filename as arguments")
-        print("e.g.: python3 run.py feeds subscriptions.xml")
-        exit(1)
+    reader = PBRR(
+        data_path=arguments.data_path, opml_filenames=arguments.opml_filenames, parse_workers=arguments.parse_workers
+    )
+    if arguments.daemon:
+        from pbrr.daemon import Daemon
+
+        Daemon(reader=reader).run()
+    else:
+        reader.run()
 
-    reader = PBRR(data_path=sys.argv[1], opml_filename=sys.argv[2])
-    reader.run()
+    if arguments.profile_startup:
+        # heavy libraries (`requests`, `feedparser`...) are imported at first use, so they count towards the request
+        first_request_at = reader.parser.run_stats.first_request_at
+        Log.info(
+            "> Startup: imports took {imports:.3f}s, first request sent after {first_request}".format(
+                imports=imports_time,
+                first_request=(
+                    "{:.3f}s".format(first_request_at - started_at)
+                    if first_request_at is not None
+                    else "none (no feed due)"
+                ),
+            )
+        )